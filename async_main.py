@@ -0,0 +1,185 @@
+import asyncio
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Generator
+
+from telebot import asyncio_helper
+from telebot.async_telebot import AsyncTeleBot
+from dotenv import load_dotenv
+from loguru import logger
+
+from botrequests.AsyncRequestsFromHotelsAPI import AsyncRequestToAPI
+from botrequests.Dialog import DialogBot, Action, Send, Call, Api, Search
+from botrequests.OutboundQueue import AsyncRateLimiter
+from botrequests.Metrics import metrics, MetricsServer
+from botrequests.Tracing import tracer, submit
+from botrequests.LogSetup import setup_bot_logging
+
+# настройка логирования, в каждой записи - идентификатор трассировки сценария пользователя
+# записи передаются в консоль и файл фоновым потоком; файл ротируется по размеру со сжатием старых частей
+load_dotenv()
+setup_bot_logging()
+
+
+# асинхронный вариант бота: тот же сценарий, что и MyTeleBot в main.py (шаги диалога - DialogBot),
+# действия шагов выполняются в одном цикле событий; запросы к Hotels API и Telegram не занимают потоков
+# на время ожидания ответа, обращения к SQLite (история, кэш городов, сессии) выполняются в отдельном пуле потоков
+class MyAsyncTeleBot(DialogBot, AsyncTeleBot):
+    # количество потоков для обращений к БД истории, кэшу городов и хранилищу сессий
+    db_workers = int(os.getenv('DB_WORKERS', 4))
+
+    def __init__(self, token: Any) -> None:
+        super().__init__(token)
+
+        # Пул потоков для обращений к SQLite: история запросов, кэш городов, хранилище сессий
+        self.db_executor = ThreadPoolExecutor(max_workers=self.db_workers, thread_name_prefix='db')
+        # Объект для доступа к API-процедурам Hotels
+        self.hotels_api = AsyncRequestToAPI(self.db_executor)
+        # База данных истории запросов и хранилище сессий пользователей (загрузка и сохранение сессий -
+        # в пуле потоков db_executor)
+        self.open_storage()
+        # блокировки по id пользователя: сообщения одного пользователя обрабатываются строго по очереди
+        self.chat_locks = weakref.WeakValueDictionary()
+        self.limiter = AsyncRateLimiter(global_rate=self.telegram_global_rate, chat_rate=self.telegram_chat_rate,
+                                        chat_burst=self.telegram_chat_burst)
+        # Трассировка сценариев пользователей
+        tracer.configure(trace_file=self.trace_file)
+        # Метрики состояния бота и HTTP-сервер метрик
+        self.register_metrics()
+        if self.metrics_port:
+            MetricsServer(metrics, self.metrics_host, self.metrics_port).start()
+
+    # Запуск бота: получение обновлений запросами к Telegram (long polling)
+    async def run(self) -> None:
+        await self.hotels_api.open()
+        try:
+            await self.delete_webhook()
+            await self.polling(non_stop=True, interval=0)
+        finally:
+            await self.hotels_api.close()
+            await self.close_session()
+            self.db_executor.shutdown()
+            self.user_dict.close()
+            self.DB.close()
+
+    # Выполнение обращения к БД в пуле потоков
+    async def db_call(self, fn: Callable, *args, **kwargs):
+        return await asyncio.wrap_future(submit(self.db_executor, fn, *args, **kwargs))
+
+    # Обработка сообщения пользователя: шаг диалога определяется состоянием, сохраненным в хранилище;
+    # handler - обработчик нажатия кнопки (шаг диалога не меняется);
+    # сессия загружается и сохраняется в пуле потоков db_executor
+    async def dispatch(self, message, handler: Callable = None) -> None:
+        lock = self.chat_locks.get(message.from_user.id)
+        if lock is None:
+            lock = self.chat_locks[message.from_user.id] = asyncio.Lock()
+        async with lock:
+            user = await self.db_call(self.user_dict.load, message)
+            if handler is None:
+                handler = self.next_step_handler(user)
+            try:
+                await self.run_step(handler(message))
+            finally:
+                await self.db_call(self.user_dict.release, message.from_user.id)
+
+    # Выполнение шага диалога: действия шага выполняются по порядку в цикле событий,
+    # результат (или ошибка) каждого действия передается шагу
+    async def run_step(self, step: Generator) -> None:
+        action = self.advance(step)
+        while action is not None:
+            try:
+                result = await self.perform(action)
+            except Exception as e:
+                action = self.advance(step, error=e)
+            else:
+                action = self.advance(step, result)
+
+    async def perform(self, action: Action) -> Any:
+        if isinstance(action, Send):
+            return await getattr(self, action.target)(*action.args, **action.kwargs)
+        if isinstance(action, Api):
+            return await getattr(self.hotels_api, action.target)(*action.args, **action.kwargs)
+        if isinstance(action, Search):
+            return await self.search_output(action.target, **action.kwargs)
+        if isinstance(action, Call):
+            return await self.db_call(action.target, *action.args, **action.kwargs)
+        raise TypeError(f'Неизвестное действие шага диалога <{action}>')
+
+    # Поиск отелей: каждый отель выводится в чат сразу после получения, результат - список найденных отелей
+    async def search_output(self, chat_id: int, **search) -> list:
+        hotels, texts = list(), list()
+        async for i_hotel in self.hotels_api.hotels_search_iter(**search):
+            hotels.append(i_hotel)
+            for action in self.hotel_messages(chat_id, i_hotel, texts):
+                await self.perform(action)
+        for action in self.text_messages(chat_id, texts):
+            await self.perform(action)
+        return hotels
+
+    # Отправка запроса к Telegram с ограничением частоты и повтором (как в OutboundQueue): при ответе 429 -
+    # через retry_after секунд, при ошибке соединения - с паузой 1, 2, 4... с, не более telegram_max_retries раз
+    async def send_limited(self, chat_id, func: Callable, *args, **kwargs):
+        for attempt in range(self.telegram_max_retries + 1):
+            await self.limiter.acquire(chat_id)
+            try:
+                with tracer.span(f'telegram.{func.__name__}'), \
+                        metrics.timer('telegram_request_seconds', 'Время запроса к Telegram Bot API',
+                                      method=func.__name__):
+                    return await func(*args, **kwargs)
+            except asyncio_helper.ApiTelegramException as e:
+                if e.error_code != 429 or attempt >= self.telegram_max_retries:
+                    logger.error(f'Ошибка отправки сообщения в чат <{chat_id}>. {e}')
+                    return None
+                metrics.counter('telegram_retries_total', 'Повторы отправки сообщений', ('reason',)).inc(
+                    reason='429')
+                retry_after = (e.result_json or {}).get('parameters', {}).get('retry_after', 1)
+                logger.warning(f'Превышен лимит отправки сообщений в чат <{chat_id}>, пауза {retry_after} с')
+                await asyncio.sleep(retry_after)
+            except asyncio_helper.RequestTimeout as e:
+                if attempt >= self.telegram_max_retries:
+                    logger.error(f'Ошибка отправки сообщения в чат <{chat_id}>. {e}')
+                    return None
+                metrics.counter('telegram_retries_total', 'Повторы отправки сообщений', ('reason',)).inc(
+                    reason='connection')
+                logger.warning(f'Ошибка соединения при отправке сообщения в чат <{chat_id}>. {e}')
+                await asyncio.sleep(2 ** attempt)
+            except Exception as e:
+                logger.error(f'Ошибка отправки сообщения в чат <{chat_id}>. {e}')
+                return None
+
+    async def send_message(self, chat_id, text, **kwargs):
+        return await self.send_limited(chat_id, super().send_message, chat_id, text, **kwargs)
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        return await self.send_limited(chat_id, super().edit_message_text, text, chat_id, message_id, **kwargs)
+
+    async def send_location(self, chat_id, **kwargs):
+        return await self.send_limited(chat_id, super().send_location, chat_id, **kwargs)
+
+    async def send_photo(self, chat_id, **kwargs):
+        return await self.send_limited(chat_id, super().send_photo, chat_id, **kwargs)
+
+    async def send_media_group(self, chat_id, media, **kwargs):
+        return await self.send_limited(chat_id, super().send_media_group, chat_id, media, **kwargs)
+
+
+# адрес Telegram Bot API (может быть заменен адресом локального сервера для нагрузочного тестирования)
+if os.getenv('TELEGRAM_API_URL'):
+    asyncio_helper.API_URL = os.getenv('TELEGRAM_API_URL').rstrip('/') + '/bot{0}/{1}'
+my_bot = MyAsyncTeleBot(os.getenv('BOT_TOKEN'))
+
+
+@my_bot.message_handler(content_types=['text'])
+async def start_bot(message):
+    await my_bot.dispatch(message)
+
+
+@my_bot.callback_query_handler(func=lambda call: call.data.startswith('history:'))
+async def history_page(call):
+    await my_bot.dispatch(call, my_bot.history_callback)
+
+
+if __name__ == '__main__':
+    logger.info('Бот запущен (asyncio)...')
+    asyncio.run(my_bot.run())
@@ -0,0 +1,106 @@
+"""Задержка чтения истории пользователя (db_get_user_log, db_city_list) на большой БД
+до и после миграции с индексами.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_history_db.py [количество_запросов] [отелей_в_запросе] [пользователей]
+
+По умолчанию создается БД из 500 000 запросов и 2 000 000 строк отелей
+во временном каталоге.
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from botrequests.UserHistoryDB import SqliteDB  # noqa: E402
+
+
+def fill(db: SqliteDB, queries: int, hotels_per_query: int, users: int) -> None:
+    sqlite_connection = db.get_connection()
+    # в схеме первой версии userquery ссылается на неуникальное поле hotels.id
+    sqlite_connection.execute('PRAGMA foreign_keys = OFF;')
+    start_time = time.time() - queries
+    batch = 50000
+    for offset in range(0, queries, batch):
+        count = min(batch, queries - offset)
+        sqlite_connection.executemany(
+            """INSERT INTO userquery (id, user_id, datetime, city_name, scenario) VALUES (?, ?, ?, ?, ?);""",
+            ((offset + i + 1, random.randrange(users), start_time + offset + i, f'city{random.randrange(300)}',
+              random.choice(('/lowprice', '/highprice', '/bestdeal'))) for i in range(count)))
+        sqlite_connection.executemany(
+            """INSERT INTO hotels (id, hotel_name) VALUES (?, ?);""",
+            ((offset + i + 1, f'hotel{random.randrange(20000)}')
+             for i in range(count) for _ in range(hotels_per_query)))
+        sqlite_connection.commit()
+    sqlite_connection.execute('PRAGMA foreign_keys = ON;')
+
+
+# запросы истории к схеме первой версии (таблица hotels без индексов)
+def legacy_calls(db: SqliteDB) -> tuple:
+    sqlite_connection = db.get_connection()
+    return (
+        ('db_get_user_log', lambda user_id: sqlite_connection.execute(
+            """SELECT userquery.scenario, userquery.datetime, hotels.hotel_name
+               FROM userquery LEFT JOIN hotels ON hotels.id = userquery.id
+               WHERE user_id = ? ORDER BY userquery.datetime DESC LIMIT ?;""", (user_id, 10)).fetchall()),
+        ('db_city_list', lambda user_id: sqlite_connection.execute(
+            """SELECT DISTINCT city_name FROM userquery
+               WHERE user_id = ? ORDER BY datetime DESC LIMIT 3;""", (user_id,)).fetchall())
+    )
+
+
+def measure(calls: tuple, users: int, count: int = 200) -> dict:
+    result = dict()
+    for name, call in calls:
+        timings = []
+        for _ in range(count):
+            user_id = random.randrange(users)
+            start = time.perf_counter()
+            call(user_id)
+            timings.append((time.perf_counter() - start) * 1000)
+        result[name] = timings
+    return result
+
+
+def report(title: str, result: dict) -> None:
+    print(title)
+    for name, timings in result.items():
+        timings = sorted(timings)
+        print(f'  {name:<16} mean {statistics.mean(timings):9.3f} ms   '
+              f'p50 {statistics.median(timings):9.3f} ms   p95 {timings[int(len(timings) * 0.95) - 1]:9.3f} ms')
+
+
+def main() -> None:
+    queries = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    hotels_per_query = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    users = int(sys.argv[3]) if len(sys.argv) > 3 else 10000
+    random.seed(1)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = SqliteDB()
+        db.db_filename = os.path.join(tmp_dir, 'HistoryBench.sqlite3')
+        # схема первой версии - таблицы без индексов
+        db.migrate(db.get_connection(), target_version=1)
+
+        start = time.perf_counter()
+        fill(db, queries, hotels_per_query, users)
+        print(f'БД заполнена за {time.perf_counter() - start:.1f} с: запросов {queries}, '
+              f'строк отелей {queries * hotels_per_query}, пользователей {users}')
+
+        report('Без индексов (схема версии 1):', measure(legacy_calls(db), users, count=20))
+
+        start = time.perf_counter()
+        version = db.migrate(db.get_connection())
+        print(f'Миграция до версии {version} за {time.perf_counter() - start:.1f} с')
+
+        calls = (('db_get_user_log', lambda user_id: db.db_get_user_log(user_id, 10)),
+                 ('db_city_list', lambda user_id: db.db_city_list(user_id)))
+        report(f'С индексами (схема версии {version}):', measure(calls, users))
+        db.get_connection().close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Сравнение задержки запросов: requests.request (новое соединение на каждый запрос)
+против общего HttpClient с пулом keep-alive соединений.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_http_client.py [количество_запросов] [задержка_сервера_мс]
+
+Локальный сервер-заглушка работает по HTTP без TLS, поэтому выигрыш на реальном
+API (TCP + TLS handshake на каждый запрос) будет заметно больше.
+"""
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from botrequests.HttpClient import HttpClient  # noqa: E402
+
+BODY = json.dumps({'suggestions': [{'group': 'CITY_GROUP', 'entities': []}]}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    delay = 0.0
+
+    def do_GET(self):
+        if self.delay:
+            time.sleep(self.delay)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def measure(get, url: str, count: int) -> list:
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        get(url, params={'query': 'Москва'}).content
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name: str, timings: list) -> None:
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f'{name:<28} mean {statistics.mean(timings):7.3f} ms   '
+          f'p50 {statistics.median(timings):7.3f} ms   p95 {p95:7.3f} ms')
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    StubHandler.delay = (float(sys.argv[2]) if len(sys.argv) > 2 else 0.0) / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/locations/search'
+
+    client = HttpClient(pool_size=4)
+    # прогрев
+    measure(lambda u, params: requests.request('GET', u, params=params), url, 10)
+    measure(client.get, url, 10)
+
+    print(f'{count} запросов, задержка сервера {StubHandler.delay * 1000:.0f} ms')
+    report('requests.request', measure(lambda u, params: requests.request('GET', u, params=params), url, count))
+    report('HttpClient (keep-alive)', measure(client.get, url, count))
+
+    client.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Разбор ответа properties/list: время и пиковая память.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_parsing.py [файл_ответа.json | количество_отелей]
+
+Если указан файл - используется записанный ответ properties/list, иначе генерируется ответ
+с заданным количеством отелей (по умолчанию 5000) и полями, как в ответах API.
+Сравниваются:
+  - прежний путь: response.text -> json.loads -> объекты HotelInfo с __dict__ и вложенным словарем координат;
+  - текущий путь: response.content -> json_loads (orjson, если установлен) -> HotelRecord -> HotelInfo.
+"""
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from botrequests.RequestsFromHotelsAPI import RequestToAPI, json_loads  # noqa: E402
+
+
+def make_result(i: int) -> dict:
+    return {
+        'id': 100000 + i,
+        'name': f'Отель «Центральный» №{i}',
+        'starRating': 4.0,
+        'urls': {},
+        'address': {'streetAddress': f'улица Тверская, {i}', 'extendedAddress': '', 'locality': 'Москва',
+                    'postalCode': '125009', 'region': 'Москва', 'countryName': 'Россия', 'countryCode': 'RU',
+                    'obfuscate': False},
+        'guestReviews': {'unformattedRating': 8.6, 'rating': '8,6', 'total': 1234 + i, 'scale': 10,
+                         'badge': 'excellent', 'badgeText': 'Превосходно'},
+        'landmarks': [{'label': 'Центр города', 'distance': f'{i % 17},{i % 10} км'},
+                      {'label': 'Красная площадь', 'distance': f'{i % 13},{i % 10} км'}],
+        'ratePlan': {'price': {'current': f'${100 + i % 400:,}', 'exactPrice': 100.0 + i % 400,
+                               'old': f'${150 + i % 400:,}', 'info': 'за ночь',
+                               'additionalInfo': 'Цена за ночь с учетом налогов и сборов'},
+                     'features': {'freeCancellation': True, 'paymentPreference': False, 'noCCRequired': False}},
+        'neighbourhood': 'Тверской',
+        'deals': {'specialDeal': {'dealText': 'Скидка 20%'}, 'priceReasoning': 'DRR-441'},
+        'messaging': {'scarcityMessage': 'Осталось 2 номера'},
+        'badging': {'hotelBadge': {'type': 'vipBadge', 'label': 'VIP Access'}},
+        'pimmsAttributes': 'DoubleStamps|D13|TESCO',
+        'coordinate': {'lat': 55.75 + (i % 100) / 1000, 'lon': 37.61 + (i % 77) / 1000},
+        'roomsLeft': i % 5,
+        'providerType': 'LOCAL',
+        'supplierHotelId': 200000 + i,
+        'vrBadge': None,
+        'isAlternative': False,
+        'optimizedThumbUrls': {'srpDesktop': f'https://exp.cdn-hotels.com/hotels/{i}/{i}_z.jpg?impolicy=fcrop'},
+    }
+
+
+def make_payload(count: int) -> bytes:
+    body = {'result': 'OK', 'data': {'body': {'header': 'Москва, Россия', 'query': {'destination': {'id': '1153093'}},
+                                             'searchResults': {'totalCount': count,
+                                                               'results': [make_result(i) for i in range(count)]}}}}
+    return json.dumps(body, ensure_ascii=False).encode('utf-8')
+
+
+def make_response(content: bytes) -> requests.Response:
+    response = requests.Response()
+    response._content = content
+    response.status_code = 200
+    response.encoding = 'utf-8'
+    return response
+
+
+# объект отеля, как до перехода на NamedTuple: атрибуты в __dict__ и вложенный словарь координат
+class DictHotelInfo:
+    def __init__(self) -> None:
+        self.hotel_id = 0
+        self.hotel_name = ''
+        self.hotel_address = ''
+        self.distance_from_center = 0
+        self.distance = None
+        self.price = 0
+        self.destination_id = None
+        self.hotel_image_url = list()
+        self.hotel_location = {'lat': 0.0, 'lon': 0.0}
+
+
+def old_parse(response: requests.Response) -> list:
+    results = json.loads(response.text)['data']['body']['searchResults']['results']
+    hotels = list()
+    for i_results in results:
+        record = RequestToAPI.parse_hotel(i_results)
+        hotel = DictHotelInfo()
+        hotel.hotel_id = record.hotel_id
+        hotel.hotel_name = record.hotel_name
+        hotel.hotel_address = record.hotel_address
+        hotel.hotel_location = {'lat': record.lat, 'lon': record.lon}
+        hotel.distance_from_center = record.distance_from_center
+        hotel.distance = record.distance
+        hotel.price = record.price
+        hotels.append(hotel)
+    return hotels
+
+
+def new_parse(response: requests.Response, loads=json_loads) -> list:
+    results = loads(response.content)['data']['body']['searchResults']['results']
+    return [RequestToAPI.hotel_from_record(RequestToAPI.parse_hotel(i_results)) for i_results in results]
+
+
+# время (лучшее из repeat), пиковая память при разборе и память, занятая результатом
+def measure(func, repeat: int = 5) -> tuple:
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, retained, len(result)
+
+
+def main() -> None:
+    arg = sys.argv[1] if len(sys.argv) > 1 else '5000'
+    if os.path.isfile(arg):
+        with open(arg, 'rb') as file:
+            content = file.read()
+    else:
+        content = make_payload(int(arg))
+    response = make_response(content)
+    print(f'Размер ответа: {len(content) / 2 ** 20:.1f} MiB, json_loads: {json_loads.__module__}')
+
+    variants = [('text + json.loads, HotelInfo с __dict__', lambda: old_parse(response)),
+                ('content + json.loads, HotelInfo', lambda: new_parse(response, json.loads))]
+    if json_loads is not json.loads:
+        variants.append((f'content + {json_loads.__module__}, HotelInfo', lambda: new_parse(response)))
+    for title, func in variants:
+        elapsed, peak, retained, count = measure(func)
+        print(f'  {title:42} {elapsed * 1000:8.1f} мс   пик {peak / 2 ** 20:6.1f} MiB   '
+              f'результат {retained / 2 ** 20:5.1f} MiB ({count} отелей)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Ранжирование кандидатов /bestdeal: NumPy (HotelRanker) и поотельный цикл на Python.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_ranking.py [количество_кандидатов] [количество_отелей]
+
+Кандидаты - синтетические записи HotelRecord со случайными ценой и расстоянием до центра
+(часть без данных). Цикл на Python повторяет прежний порядок обработки в hotels_search:
+каждый отель обрабатывается отдельно, затем список сортируется целиком.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from botrequests.Ranking import HotelRanker  # noqa: E402
+from botrequests.RequestsFromHotelsAPI import HotelRecord  # noqa: E402
+
+
+def make_candidates(count: int) -> list:
+    rnd = random.Random(1)
+    candidates = list()
+    for i in range(count):
+        price = round(rnd.uniform(20, 800), 2) if rnd.random() > 0.02 else None
+        distance = round(rnd.uniform(0.1, 25), 1) if rnd.random() > 0.05 else None
+        candidates.append(HotelRecord(i, f'Отель {i}', 'адрес', 0.0, 0.0, f'{distance} км', distance,
+                                      f'${price}', price))
+    return candidates
+
+
+# поотельный расчет той же оценки и полная сортировка
+def rank_python(candidates: list, top: int, price_weight: float = 0.5, distance_weight: float = 0.5) -> list:
+    valid = [i for i in candidates if i.price_value is not None and i.distance is not None]
+    if not valid:
+        return list()
+    min_price = min(i.price_value for i in valid)
+    price_spread = max(i.price_value for i in valid) - min_price
+    min_distance = min(i.distance for i in valid)
+    distance_spread = max(i.distance for i in valid) - min_distance
+    scored = list()
+    for i_hotel in valid:
+        price = (i_hotel.price_value - min_price) / price_spread if price_spread > 0 else 0.0
+        distance = (i_hotel.distance - min_distance) / distance_spread if distance_spread > 0 else 0.0
+        scored.append((price_weight * price + distance_weight * distance, i_hotel))
+    scored.sort(key=lambda i: i[0])
+    return [i[1] for i in scored[:top]]
+
+
+def measure(func, repeat: int = 5) -> tuple:
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    top = int(sys.argv[2]) if len(sys.argv) > 2 else 25
+    candidates = make_candidates(count)
+    ranker = HotelRanker()
+    print(f'Кандидатов: {count}, выводится отелей: {top}')
+
+    python_result, python_time = measure(lambda: rank_python(candidates, top))
+    numpy_result, numpy_time = measure(lambda: ranker.rank(candidates, top))
+    prices, distances = ranker.to_arrays(candidates)
+    _, arrays_time = measure(lambda: ranker.to_arrays(candidates))
+    _, top_time = measure(lambda: ranker.top_indexes(prices, distances, top))
+
+    print(f'  цикл Python          {python_time * 1000:8.2f} мс')
+    print(f'  NumPy, всего         {numpy_time * 1000:8.2f} мс   ускорение x{python_time / numpy_time:.1f}')
+    print(f'    из них в массивы   {arrays_time * 1000:8.2f} мс')
+    print(f'    оценка и отбор     {top_time * 1000:8.2f} мс')
+    same = [i.hotel_id for i in python_result] == [i.hotel_id for i in numpy_result]
+    print(f'  результаты совпадают: {"да" if same else "нет"}')
+
+
+if __name__ == '__main__':
+    main()
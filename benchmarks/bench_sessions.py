@@ -0,0 +1,113 @@
+"""Стоимость хранения сессий пользователей в PersistentSessionStore и их удаление очисткой.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_sessions.py [количество_сессий, по умолчанию 100000]
+
+Сравнивается объем памяти сессий User (__slots__) и таких же объектов с __dict__,
+затем для хранилищ состояния memory и sqlite измеряется время обработки сообщения
+(загрузка сессии и ее сохранение), объем сохраненного состояния, ограничение количества сессий
+(удаление самых старых сессий) и удаление неактивных сессий.
+"""
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from botrequests.Session import User  # noqa: E402
+from botrequests.StateStore import PersistentSessionStore, MemoryStateBackend, SqliteStateBackend  # noqa: E402
+
+
+def fake_message(user_id: int) -> SimpleNamespace:
+    return SimpleNamespace(from_user=SimpleNamespace(id=user_id, username=f'user{user_id}',
+                                                     first_name='Имя', last_name='Фамилия'))
+
+
+# такой же объект сессии, но с атрибутами в __dict__ (как до перехода на __slots__)
+class DictUser:
+    def __init__(self, message):
+        User.__init__(self, message)
+
+
+def measure(create, count: int) -> tuple:
+    messages = [fake_message(i) for i in range(count)]
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    objects = create(messages)
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return objects, size, elapsed
+
+
+# обработка одного сообщения каждого пользователя: загрузка сессии, изменение шага диалога, сохранение
+def fill(store: PersistentSessionStore):
+    def create(messages):
+        for i_message in messages:
+            user = store.load(i_message)
+            user.step = 'city_search'
+            store.release(i_message.from_user.id)
+        return store
+    return create
+
+
+# size_of - объем сохраненного состояния хранилища, байт
+def bench_store(name: str, backend, count: int, size_of) -> None:
+    messages = [fake_message(i) for i in range(count)]
+    start = time.perf_counter()
+    store = fill(PersistentSessionStore(backend, idle_timeout=3600, max_sessions=count))(messages)
+    elapsed = time.perf_counter() - start
+    print(f'  {name:<8} состояние {size_of() / 2 ** 20:8.1f} MiB   сессий {len(store)}   '
+          f'сообщение {elapsed / count * 1e6:6.1f} мкс')
+
+    # повторная загрузка сохраненных сессий (следующее сообщение каждого пользователя)
+    start = time.perf_counter()
+    for user_id in range(count):
+        store.get(user_id)
+    print(f'  {name:<8} чтение сессии {(time.perf_counter() - start) / count * 1e6:6.1f} мкс')
+
+    # ограничение количества сессий: самые старые состояния удаляются при сохранении новой сессии сверх лимита
+    store.max_sessions = count // 10
+    start = time.perf_counter()
+    removed = store.trim()
+    print(f'  {name:<8} лимит {count // 10}: удалено {removed} сессий за {time.perf_counter() - start:.3f} с, '
+          f'осталось {len(store)}')
+
+    # удаление неактивных сессий: все оставшиеся сессии старше idle_timeout
+    store.idle_timeout = 0
+    start = time.perf_counter()
+    removed = store.sweep()
+    print(f'  {name:<8} очистка: удалено {removed} сессий за {time.perf_counter() - start:.3f} с, '
+          f'осталось {len(store)}')
+    store.close()
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print(f'Сессий: {count}')
+
+    _, dict_size, _ = measure(lambda messages: [DictUser(i) for i in messages], count)
+    _, slots_size, _ = measure(lambda messages: [User(i) for i in messages], count)
+    print(f'  User с __dict__   {dict_size / 2 ** 20:8.1f} MiB   {dict_size / count:6.0f} байт на сессию')
+    print(f'  User с __slots__  {slots_size / 2 ** 20:8.1f} MiB   {slots_size / count:6.0f} байт на сессию')
+
+    # хранилище в памяти процесса: объем - память, занятая сохраненными состояниями (строки JSON)
+    memory = MemoryStateBackend()
+    bench_store('memory', memory, count, lambda: sum(sys.getsizeof(i[0]) for i in memory.states.values()))
+
+    # хранилище SQLite во временном каталоге данных: объем - размер файла базы с журналом WAL
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.environ['BOT_DATA_DIR'] = data_dir
+        backend = SqliteStateBackend()
+
+        def file_size() -> int:
+            return sum(os.path.getsize(os.path.join(data_dir, i)) for i in os.listdir(data_dir))
+        bench_store('sqlite', backend, count, file_size)
+
+
+if __name__ == '__main__':
+    main()
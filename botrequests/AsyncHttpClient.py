@@ -0,0 +1,48 @@
+import asyncio
+
+import aiohttp
+from loguru import logger
+
+from botrequests.HttpClient import RetryPolicy
+
+
+# Асинхронный вариант HttpClient на aiohttp: пул постоянных соединений, таймауты и повтор запросов
+# сессия создается методом open внутри работающего цикла событий
+class AsyncHttpClient(RetryPolicy):
+
+    def __init__(self, headers: dict = None, pool_size: int = 10, connect_timeout: float = 5.0,
+                 read_timeout: float = 20.0, max_retries: int = 3, backoff_factor: float = 0.5,
+                 backoff_max: float = 10.0) -> None:
+        super().__init__(max_retries, backoff_factor, backoff_max)
+        # заголовки без значения не передаются (как в requests)
+        self.headers = {key: value for key, value in (headers or {}).items() if value is not None}
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout, sock_read=read_timeout)
+        self.session = None
+
+    async def open(self) -> None:
+        connector = aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(headers=self.headers, connector=connector, timeout=self.timeout)
+
+    # GET-запрос с повтором при ошибках соединения, таймаутах и ответах 5xx/429, результат - тело ответа
+    async def get(self, url: str, params: dict = None) -> bytes:
+        attempt = 0
+        while True:
+            try:
+                async with self.session.get(url, params=params) as response:
+                    if response.status not in self.retry_status or attempt >= self.max_retries:
+                        return await response.read()
+                    delay = self.backoff(attempt, self.retry_after(response.status, response.headers))
+                    logger.warning(f'Ответ сервера {response.status} <{url}>, повтор через {delay:.2f} с.')
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                logger.warning(f'Ошибка соединения <{url}>, повтор через {delay:.2f} с. {e}')
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
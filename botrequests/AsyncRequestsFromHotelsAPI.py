@@ -0,0 +1,207 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Optional
+
+import aiohttp
+from loguru import logger
+
+from botrequests.AsyncHttpClient import AsyncHttpClient
+from botrequests.Metrics import metrics
+from botrequests.RequestsFromHotelsAPI import HotelsApiBase, HotelInfo, HotelRecord, json_loads
+from botrequests.SingleFlight import AsyncSingleFlight
+from botrequests.Tracing import tracer, submit
+
+
+# Асинхронный вариант класса запросов к Hotel API
+# настройки, кэши, пространственный индекс, ранжирование, разбор ответов и отбор отелей - общие с RequestToAPI
+# (HotelsApiBase); запросы к API выполняются через пул соединений aiohttp, обращения к SQLite кэша городов -
+# в отдельном пуле потоков db_executor, чтобы не блокировать цикл событий
+class AsyncRequestToAPI(HotelsApiBase):
+
+    def __init__(self, db_executor: ThreadPoolExecutor = None) -> None:
+        super().__init__()
+        self.db_executor = db_executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='db')
+        self.http = AsyncHttpClient(self.headers, pool_size=max(self.pool_size, self.photo_workers),
+                                    connect_timeout=self.connect_timeout, read_timeout=self.read_timeout,
+                                    max_retries=self.max_retries)
+        self.single_flight = AsyncSingleFlight()
+        self.photo_limit = None
+        # задачи фонового обновления кэша поиска
+        self.background = set()
+
+    # создание пула соединений (вызывается в работающем цикле событий)
+    async def open(self) -> None:
+        await self.http.open()
+        self.photo_limit = asyncio.Semaphore(self.photo_workers)
+
+    async def close(self) -> None:
+        await self.http.close()
+
+    # выполнение блокирующей функции в пуле потоков db_executor
+    async def run_blocking(self, fn: Callable, *args):
+        return await asyncio.wrap_future(submit(self.db_executor, fn, *args))
+
+    # GET-запрос к API с преобразованием ответа из json в словарь
+    # одинаковые одновременные запросы выполняются одним обращением к серверу
+    async def get_json(self, url: str, querystring: dict) -> dict:
+        async def request() -> dict:
+            endpoint = self.endpoint(url)
+            with tracer.span(f'http.{endpoint}', params=querystring), \
+                    metrics.timer('hotels_api_request_seconds', 'Время запроса к Hotels API', endpoint=endpoint):
+                return json_loads(await self.http.get(url, params=querystring))
+        return await self.single_flight.do(self.request_key(url, querystring), request)
+
+    # метод поиска dectination_id города по его названию
+    @tracer.traced('api.city_search')
+    async def city_search(self, city_name: str) -> int:
+        # поиск города в кэше
+        found, cached_id = await self.run_blocking(self.city_cache.get, city_name, self.locale)
+        if found:
+            logger.info(f'Город <{city_name}> найден в кэше: {cached_id}. {self.city_cache.stats()}')
+            return cached_id
+
+        try:
+            response_dict = await self.get_json(self.url_locations, self.city_querystring(city_name))
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.error(f'Ошибка запроса к API <{self.url_locations}>. {e}')
+            return 0
+
+        try:
+            dest_id, center = self.parse_city(response_dict, city_name)
+        except KeyError:
+            logger.error(f'Ошибка получения данных API <{response_dict}>')
+            return 0
+        return await self.run_blocking(self.store_city, city_name, dest_id, center)
+
+    # метод поиска фотографий отеля по его id
+    # количество одновременных запросов фотографий ограничено photo_workers
+    @tracer.traced('api.get_hotels_photo')
+    async def get_hotels_photo(self, hotel_id: int, number_of_photo: int = 25) -> list:
+        try:
+            async with self.photo_limit:
+                response_dict = await self.get_json(self.url_photo, {"id": str(hotel_id)})
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.error(f'Ошибка запроса к API <{self.url_photo}>. {e}')
+            return list()
+        return self.parse_photos(response_dict, number_of_photo)
+
+    # параллельный поиск фотографий для списка отелей, списки URL-фотографий выдаются в порядке id отелей
+    async def get_hotels_photo_iter(self, hotel_ids: list, number_of_photo: int = 25) -> AsyncIterator[list]:
+        tasks = [asyncio.ensure_future(self.get_hotels_photo(hotel_id, number_of_photo)) for hotel_id in hotel_ids]
+        try:
+            for task in tasks:
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    # запрос списка отелей properties/list, результат - список компактных записей HotelRecord
+    # None - если данные от API не получены
+    async def properties_list(self, querystring: dict) -> Optional[list]:
+        try:
+            response_dict = await self.get_json(self.url_properties, querystring)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.error(f'Ошибка запроса к API <{self.url_properties}>. {e}')
+            return None
+        # центр города загружается из кэша городов заранее, чтобы расчет расстояний не обращался к SQLite
+        await self.run_blocking(self.city_center, int(querystring['destinationId']))
+        return self.parse_properties(querystring, response_dict)
+
+    # страница результатов поиска из кэша (с фоновым обновлением устаревших данных) или от сервера
+    async def cached_properties_list(self, querystring: dict) -> Optional[list]:
+        key = self.search_cache_key(querystring)
+        found, records, refresh = self.search_cache.lookup(key)
+        if refresh:
+            task = asyncio.ensure_future(self.refresh_properties_list(key, querystring))
+            self.background.add(task)
+            task.add_done_callback(self.background.discard)
+        if found:
+            return records
+        records = await self.properties_list(querystring)
+        if records is not None:
+            self.search_cache.set(key, records)
+        return records
+
+    async def refresh_properties_list(self, key, querystring: dict) -> None:
+        try:
+            records = await self.properties_list(querystring)
+            if records is not None:
+                self.search_cache.set(key, records)
+        except Exception as e:
+            logger.error(f'Ошибка фонового обновления кэша поиска. {e}')
+        finally:
+            self.search_cache.release(key)
+
+    async def hotels_search(self, dest_id, page_size: int, sort_order='PRICE', min_distance=0, max_distance=0,
+                            min_price=0, max_price=0, hotel_photo=0) -> list:
+        return [i async for i in self.hotels_search_iter(dest_id, page_size, sort_order=sort_order,
+                                                         min_distance=min_distance, max_distance=max_distance,
+                                                         min_price=min_price, max_price=max_price,
+                                                         hotel_photo=hotel_photo)]
+
+    # потоковый вариант поиска отелей: отели выдаются по одному в порядке результатов поиска,
+    # фотографии всех отобранных отелей запрашиваются одновременно
+    @tracer.traced('api.hotels_search')
+    async def hotels_search_iter(self, dest_id, page_size: int, sort_order='PRICE', min_distance=0, max_distance=0,
+                                 min_price=0, max_price=0, hotel_photo=0) -> AsyncIterator[HotelInfo]:
+        plan = self.search_plan(dest_id, page_size, sort_order, min_distance, max_distance, min_price, max_price)
+        records = plan.records
+        if records is None:
+            records = [i async for i in self.select_records(plan.querystring, plan.max_pages, plan.limit,
+                                                            min_distance, max_distance)]
+            if plan.rank:
+                records = self.ranker.rank(records, page_size)
+
+        hotels = [self.hotel_from_record(record) for record in records]
+        if hotel_photo <= 0:
+            for curr_hotel in hotels:
+                yield curr_hotel
+            return
+        photos = self.get_hotels_photo_iter([curr_hotel.hotel_id for curr_hotel in hotels], hotel_photo)
+        try:
+            for curr_hotel in hotels:
+                yield curr_hotel._replace(hotel_image_url=tuple(await photos.__anext__()))
+        finally:
+            await photos.aclose()
+
+    # отбор записей отелей по расстоянию до центра города со страниц результатов поиска
+    async def select_records(self, querystring: dict, max_pages: int, page_size: int, min_distance=0,
+                             max_distance=0) -> AsyncIterator[HotelRecord]:
+        count = 0
+        async for records in self.properties_pages(querystring, max_pages):
+            selected = self.select_page(records, page_size - count, min_distance, max_distance)
+            for record in selected:
+                yield record
+            count += len(selected)
+            if count >= page_size:
+                return
+
+    # последовательное получение страниц результатов поиска (из кэша или от сервера)
+    # пока обрабатывается текущая страница, следующая запрашивается заранее (если включено bestdeal_prefetch);
+    # если получены все страницы, их отели сохраняются как охват индекса города
+    async def properties_pages(self, querystring: dict, max_pages: int) -> AsyncIterator[list]:
+        next_page, pages = None, list()
+        try:
+            for page_number in range(1, max_pages + 1):
+                if next_page is not None:
+                    records = await next_page
+                else:
+                    records = await self.cached_properties_list(dict(querystring, pageNumber=str(page_number)))
+                next_page = None
+                if not records:
+                    if records is not None:
+                        self.store_coverage(querystring, pages)
+                    return
+                last_page = self.is_last_page(records, querystring, page_number, max_pages)
+                if self.bestdeal_prefetch and not last_page:
+                    next_page = asyncio.ensure_future(
+                        self.cached_properties_list(dict(querystring, pageNumber=str(page_number + 1))))
+                pages.append(records)
+                yield records
+                if self.is_complete(records, querystring):
+                    self.store_coverage(querystring, pages)
+                if last_page:
+                    return
+        finally:
+            if next_page is not None:
+                next_page.cancel()
@@ -0,0 +1,153 @@
+import os.path
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from loguru import logger
+
+
+# Класс кэша в памяти с вытеснением давно не использованных записей (LRU) и временем жизни записей
+class LRUCache:
+
+    def __init__(self, maxsize: int = 1000) -> None:
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    # получение значения по ключу, возвращает пару (найдено, значение)
+    def get(self, key) -> tuple:
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return False, None
+            value, expires = item
+            if expires < time.time():
+                del self.data[key]
+                return False, None
+            self.data.move_to_end(key)
+            return True, value
+
+    # сохранение значения с временем жизни ttl (с)
+    def set(self, key, value, ttl: float) -> None:
+        with self.lock:
+            self.data[key] = (value, time.time() + ttl)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+
+# Класс двухуровневого кэша destinationId городов: LRU в памяти и таблица SQLite на диске
+# вместе с destinationId на диске хранятся координаты центра города (если получены от API)
+class CityCache:
+
+    def __init__(self, file_name: str = 'CityCache.sqlite3', ttl: float = 7 * 24 * 3600,
+                 negative_ttl: float = 600, maxsize: int = 1000) -> None:
+        self.BASE_DIR = os.getenv('BOT_DATA_DIR', os.path.dirname(os.path.abspath(__file__)))
+        self.db_path = os.path.join(self.BASE_DIR, file_name)
+        self.ttl = ttl                      # время жизни найденных городов
+        self.negative_ttl = negative_ttl    # время жизни результата "город не найден"
+        self.memory = LRUCache(maxsize)
+        # счетчики попаданий и промахов кэша
+        self.hits = 0
+        self.misses = 0
+
+        self.lock = threading.Lock()
+        self.connection = None
+        try:
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS city_cache (
+                                        city_key TEXT NOT NULL,
+                                        locale TEXT NOT NULL,
+                                        destination_id INTEGER NOT NULL,
+                                        expires REAL NOT NULL,
+                                        lat REAL,
+                                        lon REAL,
+                                        PRIMARY KEY (city_key, locale));""")
+            # добавление координат центра города в таблицу, созданную до их появления
+            columns = {row[1] for row in self.connection.execute("PRAGMA table_info(city_cache);")}
+            for column in ('lat', 'lon'):
+                if column not in columns:
+                    self.connection.execute(f"ALTER TABLE city_cache ADD COLUMN {column} REAL;")
+            self.connection.commit()
+        except sqlite3.Error as e:
+            logger.error(f'Ошибка БД кэша городов. {e}')
+            self.connection = None
+
+    # нормализация названия города: лишние пробелы и регистр символов не учитываются
+    @staticmethod
+    def normalize(city_name: str) -> str:
+        return ' '.join(city_name.split()).casefold()
+
+    # поиск destinationId города в кэше, возвращает пару (найдено, destinationId)
+    # destinationId = 0 - сохраненный результат "город не найден"
+    def get(self, city_name: str, locale: str) -> tuple:
+        key = (self.normalize(city_name), locale)
+        found, dest_id = self.memory.get(key)
+        if not found and self.connection:
+            try:
+                with self.lock:
+                    row = self.connection.execute("""SELECT destination_id, expires FROM city_cache
+                                                    WHERE city_key = ? AND locale = ?;""", key).fetchone()
+            except sqlite3.Error as e:
+                logger.error(f'Ошибка БД кэша городов. {e}')
+                row = None
+            if row and row[1] > time.time():
+                found, dest_id = True, row[0]
+                self.memory.set(key, dest_id, row[1] - time.time())
+
+        # счетчики изменяются под блокировкой кэша в памяти (get вызывается из нескольких потоков)
+        with self.memory.lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return found, dest_id
+
+    # сохранение результата поиска города в кэше
+    # center - координаты центра города (lat, lon), если известны
+    def set(self, city_name: str, locale: str, dest_id: int, center: tuple = None) -> None:
+        key = (self.normalize(city_name), locale)
+        ttl = self.ttl if dest_id else self.negative_ttl
+        lat, lon = center or (None, None)
+        self.memory.set(key, dest_id, ttl)
+        if self.connection:
+            try:
+                with self.lock:
+                    self.connection.execute("""INSERT OR REPLACE INTO city_cache
+                                              (city_key, locale, destination_id, expires, lat, lon)
+                                              VALUES (?, ?, ?, ?, ?, ?);""",
+                                            (*key, dest_id, time.time() + ttl, lat, lon))
+                    self.connection.commit()
+            except sqlite3.Error as e:
+                logger.error(f'Ошибка БД кэша городов. {e}')
+
+    # координаты центра города (lat, lon) по destinationId, None - если они не сохранены
+    def center(self, dest_id: int) -> Optional[tuple]:
+        if not self.connection or not dest_id:
+            return None
+        try:
+            with self.lock:
+                row = self.connection.execute("""SELECT lat, lon FROM city_cache
+                                                WHERE destination_id = ? AND lat IS NOT NULL AND lon IS NOT NULL
+                                                LIMIT 1;""", (dest_id,)).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f'Ошибка БД кэша городов. {e}')
+            return None
+        return tuple(row) if row else None
+
+    # статистика использования кэша
+    def stats(self) -> dict:
+        with self.memory.lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+            'size': len(self.memory)
+        }
@@ -0,0 +1,493 @@
+import functools
+import os
+import time
+from typing import Any, Callable, Generator, Optional
+
+from telebot import types
+from loguru import logger
+
+from botrequests.RequestsFromHotelsAPI import HotelInfo
+from botrequests.UserHistoryDB import SqliteDB
+from botrequests.Session import User
+from botrequests.StateStore import PersistentSessionStore, create_backend
+from botrequests.Metrics import metrics
+from botrequests.Tracing import tracer, new_trace_id, trace_id_var
+
+
+# Действие шага диалога: шаг диалога - генератор, который выдает действия, а бот выполняет их
+# (синхронный бот - в потоке обработки сообщения, асинхронный - в цикле событий) и передает результат шагу
+class Action:
+    __slots__ = ('target', 'args', 'kwargs')
+
+    def __init__(self, target, *args, **kwargs) -> None:
+        self.target = target
+        self.args = args
+        self.kwargs = kwargs
+
+
+# отправка запроса к Telegram: target - имя метода бота (send_message, send_photo, ...)
+class Send(Action):
+    __slots__ = ()
+
+
+# блокирующий вызов (БД истории, хранилище сессий): target - функция;
+# асинхронный бот выполняет ее в пуле потоков
+class Call(Action):
+    __slots__ = ()
+
+
+# запрос к Hotels API: target - имя метода hotels_api (синхронного или асинхронного)
+class Api(Action):
+    __slots__ = ()
+
+
+# поиск отелей с выводом каждого отеля в чат по мере получения: target - id чата,
+# kwargs - параметры hotels_search_iter; результат - список найденных отелей
+class Search(Action):
+    __slots__ = ()
+
+
+# измерение времени обработки шагов диалога (метрика bot_handler_seconds с именем обработчика)
+# и интервал трассировки сценария пользователя; profile=True - шаг профилируется, если он выполняется
+# дольше порога PROFILE_SLOW_SEARCH; время шага включает выполнение выданных им действий
+def timed_handler(func=None, *, profile: bool = False):
+    if func is None:
+        return functools.partial(timed_handler, profile=profile)
+    timed = metrics.timed('bot_handler_seconds', 'Время обработки шага диалога', handler=func.__name__)(func)
+
+    @functools.wraps(func)
+    def wrapper(self, message, *args, **kwargs):
+        with tracer.trace(self.flow_trace_id(message)), \
+                tracer.span(f'handler.{func.__name__}', profile=profile, user_id=message.from_user.id):
+            return (yield from timed(self, message, *args, **kwargs))
+    return wrapper
+
+
+# Сценарий бота, общий для MyTeleBot (main.py) и MyAsyncTeleBot (async_main.py): настройки, сессии,
+# шаги диалога и формирование сообщений; класс бота выполняет действия шагов (см. Action)
+class DialogBot:
+    # максимальная длина текста сообщения и подписи к фотографии Telegram, количество фотографий в альбоме
+    message_max_length = 4096
+    caption_max_length = 1024
+    media_group_size = 10
+    # способ вывода результатов поиска: 'album' - альбомами и общими сообщениями, 'single' - по одному сообщению
+    result_delivery = os.getenv('RESULT_DELIVERY', 'single')
+
+    # Инициализация объекта взаимодействия с базой данных истории запросов пользователей
+    DB = SqliteDB()
+
+    # параметры хранилища сессий: время бездействия до удаления сессии (с), максимальное количество сессий,
+    # интервал очистки неактивных сессий (с)
+    session_idle_timeout = float(os.getenv('SESSION_IDLE_TIMEOUT', 1800))
+    session_max = int(os.getenv('SESSION_MAX', 10000))
+    session_sweep_interval = float(os.getenv('SESSION_SWEEP_INTERVAL', 60))
+    # хранилище состояния диалогов: 'sqlite' - файл ChatState.sqlite3 (общий для процессов бота),
+    # 'memory' - память процесса, 'module:Class' - собственный класс хранилища (наследник StateBackend)
+    state_backend = os.getenv('STATE_BACKEND', 'sqlite')
+    # ограничения частоты отправки сообщений (сообщений в секунду) - общее и для одного чата,
+    # допустимое количество сообщений в чат подряд, количество повторов отправки при ошибках
+    telegram_global_rate = float(os.getenv('TELEGRAM_GLOBAL_RATE', 30))
+    telegram_chat_rate = float(os.getenv('TELEGRAM_CHAT_RATE', 1))
+    telegram_chat_burst = float(os.getenv('TELEGRAM_CHAT_BURST', 3))
+    telegram_max_retries = int(os.getenv('TELEGRAM_MAX_RETRIES', 3))
+    # адрес HTTP-сервера метрик в формате Prometheus (порт 0 - сервер не запускается)
+    metrics_host = os.getenv('METRICS_HOST', '127.0.0.1')
+    metrics_port = int(os.getenv('METRICS_PORT', 0))
+    # файл JSONL для записи интервалов трассировки (пустая строка - запись отключена)
+    trace_file = os.getenv('TRACE_FILE', '')
+    # обработчики, имя которых может быть сохранено как следующий шаг диалога
+    dialog_steps = ('start', 'user_history', 'city_search', 'page_size_request', 'select_hotels_photo',
+                    'number_of_photo_request', 'price_range_request', 'distance_range_request')
+
+    # Начальная инициализация базы данных для хранения истории запросов,
+    # хранилища сессий - состояние активных пользователей работающих с ботом
+    # (в сессии хранятся параметры поиска и следующий шаг диалога каждого пользователя).
+    # Сессия загружается из хранилища состояния для каждого сообщения, поэтому диалог продолжается
+    # после перезапуска бота и может обрабатываться любым из процессов бота.
+    def open_storage(self) -> None:
+        self.DB.db_connect(file_name='HistoryDB.sqlite3')
+        self.user_dict = PersistentSessionStore(create_backend(self.state_backend),
+                                                idle_timeout=self.session_idle_timeout,
+                                                max_sessions=self.session_max)
+        self.user_dict.start_sweeper(self.session_sweep_interval)
+
+    # Показатели состояния: доля попаданий в кэши, длина очереди записи истории, количество активных сессий
+    def register_metrics(self) -> None:
+        api = self.hotels_api
+        metrics.gauge('city_cache_hit_rate', 'Доля запросов городов, найденных в кэше',
+                      lambda: api.city_cache.stats()['hit_rate'])
+        metrics.gauge('city_cache_size', 'Количество городов в кэше в памяти', lambda: len(api.city_cache.memory))
+        metrics.gauge('search_cache_hit_rate', 'Доля запросов поиска отелей, выданных из кэша',
+                      lambda: api.search_cache.stats()['hit_rate'])
+        metrics.gauge('search_cache_size', 'Количество запросов в кэше результатов поиска',
+                      lambda: len(api.search_cache.data))
+        metrics.computed_counter('hotels_api_coalesced_total', 'Количество запросов к API, объединенных с одинаковыми',
+                                 lambda: api.single_flight.coalesced)
+        metrics.gauge('db_write_queue_size', 'Количество запросов в очереди записи истории',
+                      self.DB.write_queue.qsize)
+        metrics.gauge('active_sessions', 'Количество активных сессий пользователей', lambda: len(self.user_dict))
+
+    # Идентификатор трассировки сценария пользователя: хранится в сессии, команда начинает новый сценарий
+    def flow_trace_id(self, message) -> str:
+        user = self.session(message)
+        text = getattr(message, 'text', None)
+        if text and text.startswith('/') and trace_id_var.get() != user.trace_id:
+            user.trace_id = new_trace_id()
+        return user.trace_id
+
+    # Сессия пользователя, загруженная для обработки сообщения (создается при первом обращении)
+    def session(self, message) -> User:
+        return self.user_dict.get_or_create(message)
+
+    # Обработчик следующего сообщения пользователя: имя обработчика сохраняется в сессии
+    # (вместо обработчиков TeleBot в памяти процесса), поэтому допустимы только шаги из dialog_steps без аргументов
+    def register_next_step_handler(self, message, callback: Callable, *args, **kwargs) -> None:
+        if args or kwargs:
+            raise TypeError('Аргументы обработчика следующего шага диалога не сохраняются')
+        if callback.__name__ not in self.dialog_steps:
+            raise ValueError(f'Обработчик <{callback.__name__}> не является шагом диалога')
+        self.session(message).step = callback.__name__
+
+    # Обработчик сообщения по шагу диалога, сохраненному в сессии (шаг в сессии сбрасывается)
+    def next_step_handler(self, user: User) -> Callable:
+        step, user.step = user.step, ''
+        if step and step not in self.dialog_steps:
+            logger.warning(f'Неизвестный шаг диалога <{step}>, переход к началу сценария')
+            step = ''
+        return getattr(self, step or 'start')
+
+    # Передача шагу диалога результата предыдущего действия (или ошибки его выполнения),
+    # возвращает следующее действие шага, None - если шаг завершен
+    @staticmethod
+    def advance(step: Generator, result=None, error: Exception = None) -> Optional[Action]:
+        try:
+            return step.throw(error) if error is not None else step.send(result)
+        except StopIteration:
+            return None
+
+    @timed_handler
+    def start(self, message) -> Generator:
+        """Начало работы бота"""
+        # Создание объекта пользователя, если он еще не создан
+        user = self.session(message)
+        user.set_session_start()
+
+        # Обработка команд:
+        if message.text == '/start':
+            # параметры активации клавиатуры для выбора команд
+            markup = self.show_keyboard(['/lowprice', '/highprice', '/bestdeal', '/history'], )
+            yield Send('send_message', message.from_user.id, "Выберите команду.\n "
+                                                             "Справка по командам - /help:", reply_markup=markup)
+        elif message.text == '/help':
+            yield Send('send_message', message.from_user.id, 'Помощь по командам бота:'
+                                                             '\n/lowprice — вывод самых дешёвых отелей в городе.'
+                                                             '\n/highprice — вывод самых дорогих отелей в городе.'
+                                                             '\n/bestdeal — вывод отелей, наиболее подходящих по '
+                                                             'цене и расположению от центра.'
+                                                             '\n/history — вывод истории поиска.'
+                                                             '\n/start — начало работы с ботом.',
+                       reply_markup=types.ReplyKeyboardRemove())
+        elif message.text in ('/lowprice', '/highprice', '/bestdeal'):
+            titles = {'/lowprice': 'Поиск самых дешёвых отелей в городе.',
+                      '/highprice': 'Поиск самых дорогих отелей в городе.',
+                      '/bestdeal': 'Поиск отелей, наиболее подходящих по цене и расположению от центра.'}
+            # Получение списка из последних трех запрошенных пользователем городов
+            # и подготовка на его основе кнопок для выбора
+            markup = yield from self.last_city_request(message.from_user.id)
+            yield Send('send_message', message.from_user.id, f'{titles[message.text]}'
+                                                             '\n\nВведите название города, или выберите один из '
+                                                             'последних вариантов поиска:',
+                       reply_markup=markup)
+            # Сохранение сценария выбранного пользователем в объекте пользователя
+            user.set_scenario(message.text)
+            # Указание обработчика для следующего сообщения
+            self.register_next_step_handler(message, self.city_search)
+        elif message.text == '/history':
+            markup = self.show_keyboard(['3', '5', '10', '15'], )
+            yield Send('send_message', message.from_user.id, 'Cколько запросов показывать на странице истории:',
+                       reply_markup=markup)
+            self.register_next_step_handler(message, self.user_history)
+
+    # Вывод истории запросов пользователя
+    @timed_handler
+    def user_history(self, message) -> Generator:
+        if (yield from self.return_to_start(message)):
+            return
+        try:
+            per_page = int(message.text)
+            if per_page <= 0:
+                raise ValueError
+        except ValueError:
+            yield Send('send_message', message.from_user.id, '...введите количество запросов числом.')
+            self.register_next_step_handler(message, self.user_history)
+            return
+
+        text, markup = yield from self.history_page(message.from_user.id, per_page, 0)
+        yield Send('send_message', message.from_user.id, 'История Ваших запросов:',
+                   reply_markup=self.show_keyboard(['/start']))
+        yield Send('send_message', message.from_user.id, text, reply_markup=markup)
+
+    # Переход по страницам истории запросов (нажатие кнопок "назад"/"вперед")
+    @timed_handler
+    def history_callback(self, call) -> Generator:
+        _, per_page, page = call.data.split(':')
+        text, markup = yield from self.history_page(call.from_user.id, int(per_page), int(page))
+        yield Send('edit_message_text', text, call.message.chat.id, call.message.message_id, reply_markup=markup)
+        yield Send('answer_callback_query', call.id)
+
+    # Формирование страницы истории запросов: текст сообщения и кнопки перехода по страницам
+    def history_page(self, user_id: int, per_page: int, page: int) -> Generator:
+        # запрос на одну запись больше размера страницы - для проверки наличия следующей страницы
+        log = yield Call(self.history_log, user_id, per_page + 1, page * per_page)
+        if not log:
+            return 'История Ваших запросов пуста...', None
+
+        text = ''
+        for scenario, query_datetime, city_name, hotel_list in log[:per_page]:
+            hotels_text = ''.join(f'{i_hotel}\n' for i_hotel in hotel_list)
+            text += f'Дата: {time.ctime(query_datetime)}\nКоманда: {scenario}\nГород: {city_name}\n' \
+                    f'Результаты поиска:\n{hotels_text}\n'
+        if len(text) > self.message_max_length:
+            text = text[:self.message_max_length - 3] + '...'
+
+        buttons = list()
+        if page > 0:
+            buttons.append(types.InlineKeyboardButton('<< Назад', callback_data=f'history:{per_page}:{page - 1}'))
+        if len(log) > per_page:
+            buttons.append(types.InlineKeyboardButton('Вперед >>', callback_data=f'history:{per_page}:{page + 1}'))
+        markup = types.InlineKeyboardMarkup()
+        if buttons:
+            markup.row(*buttons)
+        return text, markup
+
+    # записи истории запросов пользователя списком (для выполнения в пуле потоков)
+    def history_log(self, user_id: int, limit: int, offset: int) -> list:
+        return list(self.DB.db_get_user_history(user_id=user_id, limit=limit, offset=offset))
+
+    # Процедура поиска запрошенного пользователем города
+    @timed_handler
+    def city_search(self, message) -> Generator:
+        # Если введена команда /start - то выход из текущего сценария
+        if not (yield from self.return_to_start(message)):
+            yield Send('send_message', message.from_user.id, '...ищу город...')
+            # Сохранение в объекте пользователя запрашиваемого города
+            user = self.session(message)
+            user.set_city(message.text)
+            # Поиск id города
+            destination_id = yield Api('city_search', message.text)
+            if destination_id > 0:
+                user.set_destination_id(destination_id)
+                markup = self.show_keyboard(['5', '10', '15', '20', '25'])
+                # Если город найден, то переход к следующему вопросу
+                yield Send('send_message', message.from_user.id, 'Какое количество отелей вывести?',
+                           reply_markup=markup)
+                self.register_next_step_handler(message, self.page_size_request)
+            else:
+                yield Send('send_message', message.from_user.id, 'Город не найден, попробуйте ещё раз.')
+                self.register_next_step_handler(message, self.city_search)
+
+    # Запрос количества выводимых отелей
+    @timed_handler
+    def page_size_request(self, message) -> Generator:
+        if not (yield from self.return_to_start(message)):
+            if self.session(message).set_page_size(message.text):
+                markup = self.show_keyboard(['Да', 'Нет'], )
+                yield Send('send_message', message.from_user.id, 'Выводить фотографии отелей?', reply_markup=markup)
+                self.register_next_step_handler(message, self.select_hotels_photo)
+            else:
+                yield Send('send_message', message.from_user.id, '...количество отелей должно быть не более 25-ти.')
+                self.register_next_step_handler(message, self.page_size_request)
+
+    # Запрос по выводу фотографий отелей
+    @timed_handler
+    def select_hotels_photo(self, message) -> Generator:
+        if not (yield from self.return_to_start(message)):
+            if message.text.lower() == 'да':
+                markup = self.show_keyboard(['1', '3', '5', '10', '15'], )
+                yield Send('send_message', message.from_user.id, 'Какое количество фотографий вывести?',
+                           reply_markup=markup)
+                self.register_next_step_handler(message, self.number_of_photo_request)
+            else:
+                self.session(message).set_numb_photo('0')
+                yield Send('send_message', message.from_user.id, '...вывод фотографий отключен.',
+                           reply_markup=types.ReplyKeyboardRemove())
+                # Если вывод фото не нужен - то переход к запросу данных по отелям
+                yield from self.scenario_start(message)
+
+    # Запрос количества фотографий
+    @timed_handler
+    def number_of_photo_request(self, message) -> Generator:
+        if not (yield from self.return_to_start(message)):
+            if self.session(message).set_numb_photo(message.text):
+                yield from self.scenario_start(message)
+            else:
+                yield Send('send_message', message.from_user.id,
+                           '...количество фотографий должно быть не более 25-ти.')
+                self.register_next_step_handler(message, self.number_of_photo_request)
+
+    # Выполнение запросов данных по отелям
+    @timed_handler
+    def scenario_start(self, message) -> Generator:
+        user = self.session(message)
+        if user.scenario != '/bestdeal':
+            yield Send('send_message', message.from_user.id, '...ищу отели...',
+                       reply_markup=types.ReplyKeyboardRemove())
+
+        # Запрос данных по сценарию /lowprice
+        if user.scenario == '/lowprice':
+            user.set_status('search_lowprice')
+            yield from self.result_output(message, dest_id=user.destination_id, page_size=user.page_size,
+                                          hotel_photo=user.numb_photo)
+
+        # Запрос данных по сценарию /highprice
+        elif user.scenario == '/highprice':
+            user.set_status('search_highprice')
+            yield from self.result_output(message, dest_id=user.destination_id, page_size=user.page_size,
+                                          sort_order='PRICE_HIGHEST_FIRST', hotel_photo=user.numb_photo)
+
+        # Если активен сценарий /bestdeal то переход к запросам диапазонов цен и расстояний
+        elif user.scenario == '/bestdeal':
+            yield Send('send_message', message.from_user.id, 'В каком диапазоне цен $ выбирать отели?'
+                                                             '\nmin - max', reply_markup=types.ReplyKeyboardRemove())
+            self.register_next_step_handler(message, self.price_range_request)
+
+    # Запрос диапазона цен
+    @timed_handler
+    def price_range_request(self, message) -> Generator:
+        if not (yield from self.return_to_start(message)):
+            if self.session(message).set_price(message.text):
+                yield Send('send_message', message.from_user.id, 'Введите диапазон расстояний от центра города, км'
+                                                                 '\nmin - max')
+                self.register_next_step_handler(message, self.distance_range_request)
+            else:
+                yield Send('send_message', message.from_user.id, '...диапазон не распознан, попробуйте еще раз')
+                self.register_next_step_handler(message, self.price_range_request)
+
+    # Запрос диапазона расстояний и данных по отелям для сценария /bestdeal
+    @timed_handler
+    def distance_range_request(self, message) -> Generator:
+        if not (yield from self.return_to_start(message)):
+            user = self.session(message)
+            if not user.set_distance(message.text):
+                yield Send('send_message', message.from_user.id, '...диапазон не распознан, попробуйте еще раз')
+                self.register_next_step_handler(message, self.distance_range_request)
+                return
+            yield Send('send_message', message.from_user.id, '...ищу отели...')
+
+            # запрос данных по отелям для сценария /bestdeal
+            yield from self.result_output(message, dest_id=user.destination_id, page_size=user.page_size,
+                                          sort_order='PRICE', min_distance=user.min_distance,
+                                          max_distance=user.max_distance, min_price=user.min_price,
+                                          max_price=user.max_price, hotel_photo=user.numb_photo)
+
+    # Вывод в чат результатов поиска отелей с параметрами search (см. hotels_search_iter)
+    # каждый отель выводится сразу после получения (см. hotel_messages),
+    # полный список результатов сохраняется в сессии пользователя и записывается в историю
+    @timed_handler(profile=True)
+    def result_output(self, message, **search) -> Generator:
+        user = self.session(message)
+        user.result_list = yield Search(message.from_user.id, **search)
+        # Подготовка кнопки перехода на старт
+        markup = self.show_keyboard(['/start'])
+
+        logger.info(user.get_user_log())
+
+        # Запись в базу данных результатов запроса
+        yield Call(self.DB.db_insert, user.get_user_log(), user.result_list)
+
+        logger.info(f'Количество найденных отелей - {len(user.result_list)}.')
+        yield Send('send_message', message.from_user.id, f'Количество найденных отелей - {len(user.result_list)}.'
+                                                         f'\n\n Новый поиск - /start'
+                                                         f'\n Помощь по командам бота - /help', reply_markup=markup)
+        # Удаление пользователя из списка активных пользователей
+        if (yield Call(self.user_dict.pop, message.from_user.id)) is None:
+            logger.error('Ошибка при удалении пользователя.')
+
+    # Сообщения с данными отеля, полученного при поиске
+    # result_delivery = 'album' - фотографии отеля выводятся альбомами с описанием отеля в подписи,
+    # описания отелей без фотографий накапливаются в списке texts для вывода общими сообщениями;
+    # result_delivery = 'single' - описание, местоположение и каждая фотография отеля выводятся отдельными сообщениями
+    def hotel_messages(self, chat_id: int, hotel: HotelInfo, texts: list) -> list:
+        if self.result_delivery == 'single':
+            return self.hotel_single(chat_id, hotel)
+        return self.hotel_album(chat_id, hotel, texts)
+
+    # Вывод отеля отдельными сообщениями: описание, местоположение, фотографии
+    @staticmethod
+    def hotel_single(chat_id: int, hotel: HotelInfo) -> list:
+        actions = [Send('send_message', chat_id, str(hotel))]
+        # вывод местоположения отеля на карте
+        lat, lon = hotel.lat, hotel.lon
+        if lat != 0 and lon != 0:
+            actions.append(Send('send_location', chat_id, latitude=lat, longitude=lon))
+        # вывод фотографий отеля
+        for i_photo in hotel.hotel_image_url:
+            actions.append(Send('send_photo', chat_id, photo=i_photo, caption=hotel.hotel_name))
+        return actions
+
+    # Вывод отеля альбомами фотографий (не более 10 фотографий в альбоме) с описанием в подписи
+    # описание отеля без фотографий добавляется в список texts для вывода общим сообщением
+    def hotel_album(self, chat_id: int, hotel: HotelInfo, texts: list) -> list:
+        description = str(hotel)
+        lat, lon = hotel.lat, hotel.lon
+        if lat != 0 and lon != 0:
+            description += f'\nНа карте: https://maps.google.com/?q={lat},{lon}'
+
+        if not hotel.hotel_image_url:
+            texts.append(description)
+            return list()
+
+        # накопленные описания выводятся раньше альбома, чтобы сохранить порядок отелей
+        actions = self.text_messages(chat_id, texts)
+        caption = description[:self.caption_max_length]
+        photos = hotel.hotel_image_url
+        for i_start in range(0, len(photos), self.media_group_size):
+            chunk = photos[i_start:i_start + self.media_group_size]
+            if len(chunk) == 1:
+                actions.append(Send('send_photo', chat_id, photo=chunk[0],
+                                    caption=caption if i_start == 0 else hotel.hotel_name))
+            else:
+                actions.append(Send('send_media_group', chat_id,
+                                    [types.InputMediaPhoto(i_photo, caption=caption if i == 0 else None)
+                                     for i, i_photo in enumerate(chunk)]))
+            caption = hotel.hotel_name
+        return actions
+
+    # Вывод накопленных описаний отелей минимальным количеством сообщений, список texts очищается
+    def text_messages(self, chat_id: int, texts: list) -> list:
+        actions = list()
+        message_text = ''
+        for i_text in texts:
+            if message_text and len(message_text) + len(i_text) + 2 > self.message_max_length:
+                actions.append(Send('send_message', chat_id, message_text))
+                message_text = ''
+            message_text += ('\n\n' if message_text else '') + i_text
+        if message_text:
+            actions.append(Send('send_message', chat_id, message_text[:self.message_max_length]))
+        texts.clear()
+        return actions
+
+    # функция перехвата команды старт
+    def return_to_start(self, message) -> Generator:
+        if message.text == '/start':
+            markup = self.show_keyboard(['/start'])
+            yield Send('send_message', message.from_user.id, 'Возврат на старт.', reply_markup=markup)
+            self.register_next_step_handler(message, self.start)
+            return True
+        else:
+            return False
+
+    # Функция отображение кнопок в чате
+    @staticmethod
+    def show_keyboard(list_of_button: list) -> Any:
+        markup = types.ReplyKeyboardMarkup(row_width=len(list_of_button))
+        for button in [types.KeyboardButton(str(i)) for i in list_of_button]:
+            markup.add(button)
+        return markup
+
+    # Функция запроса из истории трех последних городов
+    def last_city_request(self, user_id: int) -> Generator:
+        last_city_list = yield Call(self.DB.db_city_list, user_id=user_id)
+        if len(last_city_list) == 0:
+            return types.ReplyKeyboardRemove()
+        return self.show_keyboard(last_city_list)
@@ -0,0 +1,185 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+import numpy as np
+
+# средний радиус Земли, км
+EARTH_RADIUS_KM = 6371.0
+
+
+# расстояния по поверхности Земли (км) от точек с координатами lat, lon (массивы, градусы) до точки lat0, lon0
+def haversine(lat, lon, lat0: float, lon0: float) -> np.ndarray:
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    lat0, lon0 = math.radians(lat0), math.radians(lon0)
+    a = np.sin((lat - lat0) / 2) ** 2 + math.cos(lat0) * np.cos(lat) * np.sin((lon - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+# Класс пространственного индекса отелей одного города: равномерная сетка ячеек cell_km x cell_km
+# в локальной проекции относительно центра города; в ячейках хранятся id отелей
+# записи отелей должны иметь атрибуты hotel_id, lat, lon
+class GridIndex:
+
+    def __init__(self, center_lat: float, center_lon: float, cell_km: float = 1.0) -> None:
+        self.center_lat = center_lat
+        self.center_lon = center_lon
+        self.cell_km = cell_km
+        # длина градуса широты и долготы у центра города, км
+        self.km_per_lat = math.pi * EARTH_RADIUS_KM / 180
+        self.km_per_lon = self.km_per_lat * max(math.cos(math.radians(center_lat)), 0.01)
+        self.hotels = OrderedDict()     # id отеля -> (запись, время добавления), старые записи - в начале
+        self.cells = dict()             # ячейка -> множество id отелей
+
+    def cell(self, lat: float, lon: float) -> tuple:
+        return (math.floor((lon - self.center_lon) * self.km_per_lon / self.cell_km),
+                math.floor((lat - self.center_lat) * self.km_per_lat / self.cell_km))
+
+    # добавление (обновление) записи отеля
+    def add(self, record, now: float) -> None:
+        old = self.hotels.pop(record.hotel_id, None)
+        if old is not None:
+            self.discard_cell(old[0])
+        self.hotels[record.hotel_id] = (record, now)
+        self.cells.setdefault(self.cell(record.lat, record.lon), set()).add(record.hotel_id)
+
+    def discard_cell(self, record) -> None:
+        key = self.cell(record.lat, record.lon)
+        ids = self.cells.get(key)
+        if ids is not None:
+            ids.discard(record.hotel_id)
+            if not ids:
+                del self.cells[key]
+
+    # удаление записей, добавленных раньше expired, и самых старых записей сверх max_hotels
+    def purge(self, expired: float, max_hotels: int) -> None:
+        while self.hotels:
+            hotel_id, (record, added) = next(iter(self.hotels.items()))
+            if added >= expired and len(self.hotels) <= max_hotels:
+                break
+            del self.hotels[hotel_id]
+            self.discard_cell(record)
+
+    # отели в радиусе radius_km от точки lat, lon: список пар (запись, расстояние, км) по возрастанию расстояния
+    # просматриваются только ячейки, пересекающие квадрат вокруг круга поиска,
+    # точные расстояния до отелей из этих ячеек считаются одним векторным вызовом haversine
+    def within(self, lat: float, lon: float, radius_km: float, expired: float = 0) -> list:
+        x_min, y_min = self.cell(lat - radius_km / self.km_per_lat, lon - radius_km / self.km_per_lon)
+        x_max, y_max = self.cell(lat + radius_km / self.km_per_lat, lon + radius_km / self.km_per_lon)
+        candidates = list()
+        if (x_max - x_min + 1) * (y_max - y_min + 1) < len(self.cells):
+            for x in range(x_min, x_max + 1):
+                for y in range(y_min, y_max + 1):
+                    candidates.extend(self.hotels[i][0] for i in self.cells.get((x, y), ()))
+        else:
+            candidates.extend(record for record, _ in self.hotels.values())
+        candidates = [i for i in candidates if self.hotels[i.hotel_id][1] >= expired]
+        if not candidates:
+            return list()
+
+        distances = haversine([i.lat for i in candidates], [i.lon for i in candidates], lat, lon)
+        inside = np.flatnonzero(distances <= radius_km)
+        inside = inside[np.argsort(distances[inside], kind='stable')]
+        return [(candidates[i], float(distances[i])) for i in inside]
+
+    def __len__(self) -> int:
+        return len(self.hotels)
+
+
+# Класс кэша координат центров городов и пространственных индексов отелей по destinationId
+# отели, полученные от API, хранятся ttl секунд; количество городов ограничено max_cities (LRU)
+# охват - все отели города в диапазоне цен, полученные полным поиском (до последней неполной страницы);
+# хранится ttl секунд, не более max_coverage диапазонов на город
+class GeoIndex:
+
+    def __init__(self, ttl: float = 300, max_cities: int = 500, max_hotels: int = 5000,
+                 cell_km: float = 1.0, max_coverage: int = 8) -> None:
+        self.ttl = ttl
+        self.max_cities = max_cities
+        self.max_hotels = max_hotels
+        self.cell_km = cell_km
+        self.max_coverage = max_coverage
+        self.cities = OrderedDict()     # destinationId -> GridIndex
+        self.coverage = OrderedDict()   # destinationId -> [(мин. цена, макс. цена, записи, время добавления)]
+        self.lock = threading.Lock()
+
+    # координаты центра города (lat, lon) или None, если они неизвестны
+    def center(self, dest_id: int) -> Optional[tuple]:
+        with self.lock:
+            grid = self.cities.get(dest_id)
+            return None if grid is None else (grid.center_lat, grid.center_lon)
+
+    def set_center(self, dest_id: int, lat: float, lon: float) -> None:
+        with self.lock:
+            grid = self.cities.get(dest_id)
+            if grid is not None and (grid.center_lat, grid.center_lon) == (lat, lon):
+                return
+            self.cities[dest_id] = GridIndex(lat, lon, self.cell_km)
+            self.cities.move_to_end(dest_id)
+            while len(self.cities) > self.max_cities:
+                self.cities.popitem(last=False)
+
+    # расстояния до центра города для записей отелей; None - если центр города неизвестен
+    def distances(self, dest_id: int, records: Sequence) -> Optional[np.ndarray]:
+        center = self.center(dest_id)
+        if center is None:
+            return None
+        return haversine([i.lat for i in records], [i.lon for i in records], *center)
+
+    # добавление записей отелей в индекс города (если известен его центр)
+    def add(self, dest_id: int, records: Sequence) -> None:
+        now = time.time()
+        with self.lock:
+            grid = self.cities.get(dest_id)
+            if grid is None:
+                return
+            self.cities.move_to_end(dest_id)
+            for record in records:
+                if record.lat or record.lon:
+                    grid.add(record, now)
+            grid.purge(now - self.ttl, self.max_hotels)
+
+    # отели города в радиусе radius_km от точки lat, lon (по умолчанию - от центра города)
+    # список пар (запись, расстояние, км) по возрастанию расстояния
+    def within(self, dest_id: int, radius_km: float, lat: float = None, lon: float = None) -> list:
+        with self.lock:
+            grid = self.cities.get(dest_id)
+            if grid is None:
+                return list()
+            if lat is None or lon is None:
+                lat, lon = grid.center_lat, grid.center_lon
+            return grid.within(lat, lon, radius_km, expired=time.time() - self.ttl)
+
+    # сохранение охвата: records - все отели города с ценой от min_price до max_price (max_price = 0 - без
+    # ограничения), полученные от API; новый охват заменяет диапазоны, которые он включает
+    def cover(self, dest_id: int, min_price: float, max_price: float, records: Sequence) -> None:
+        max_price = max_price or math.inf
+        now = time.time()
+        with self.lock:
+            ranges = [i for i in self.coverage.pop(dest_id, ())
+                      if i[3] >= now - self.ttl and not (min_price <= i[0] and i[1] <= max_price)]
+            ranges.append((min_price, max_price, tuple(records), now))
+            self.coverage[dest_id] = ranges[-self.max_coverage:]
+            while len(self.coverage) > self.max_cities:
+                self.coverage.popitem(last=False)
+
+    # отели города из охвата, включающего диапазон цен от min_price до max_price (max_price = 0 - без
+    # ограничения); None - если такого охвата нет и нужен запрос к API
+    def covering(self, dest_id: int, min_price: float, max_price: float) -> Optional[tuple]:
+        max_price = max_price or math.inf
+        expired = time.time() - self.ttl
+        with self.lock:
+            for low, high, records, added in reversed(self.coverage.get(dest_id, ())):
+                if added >= expired and low <= min_price and max_price <= high:
+                    self.coverage.move_to_end(dest_id)
+                    return records
+        return None
+
+    # количество отелей в индексе города
+    def size(self, dest_id: int) -> int:
+        with self.lock:
+            grid = self.cities.get(dest_id)
+            return 0 if grid is None else len(grid)
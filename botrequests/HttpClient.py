@@ -0,0 +1,70 @@
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from loguru import logger
+
+
+# Политика повтора запросов, общая для HttpClient и AsyncHttpClient:
+# коды ответов для повтора, количество повторов и время ожидания перед повтором
+class RetryPolicy:
+    # коды ответов сервера, при которых запрос повторяется
+    retry_status = (429, 500, 502, 503, 504)
+
+    def __init__(self, max_retries: int = 3, backoff_factor: float = 0.5, backoff_max: float = 10.0) -> None:
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+
+    # время ожидания перед повтором запроса: значение заголовка Retry-After ответа 429 (не более backoff_max)
+    # или экспоненциальный рост с равномерным случайным разбросом
+    def backoff(self, attempt: int, retry_after: str = '') -> float:
+        if retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_factor * 2 ** attempt))
+
+    # значение Retry-After для повтора по коду ответа и заголовкам ('' - если заголовок не учитывается)
+    @staticmethod
+    def retry_after(status: int, headers) -> str:
+        return headers.get('Retry-After', '') if status == 429 else ''
+
+
+# Класс HTTP-клиента с пулом постоянных соединений, таймаутами и повтором запросов
+class HttpClient(RetryPolicy):
+
+    def __init__(self, headers: dict = None, pool_size: int = 10, connect_timeout: float = 5.0,
+                 read_timeout: float = 20.0, max_retries: int = 3, backoff_factor: float = 0.5,
+                 backoff_max: float = 10.0) -> None:
+        super().__init__(max_retries, backoff_factor, backoff_max)
+        self.timeout = (connect_timeout, read_timeout)
+
+        # общая сессия: соединения переиспользуются между запросами (keep-alive)
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    # GET-запрос с повтором при ошибках соединения, таймаутах и ответах 5xx/429
+    def get(self, url: str, params: dict = None) -> requests.Response:
+        attempt = 0
+        while True:
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                logger.warning(f'Ошибка соединения <{url}>, повтор через {delay:.2f} с. {e}')
+            else:
+                if response.status_code not in self.retry_status or attempt >= self.max_retries:
+                    return response
+                delay = self.backoff(attempt, self.retry_after(response.status_code, response.headers))
+                logger.warning(f'Ответ сервера {response.status_code} <{url}>, повтор через {delay:.2f} с.')
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self) -> None:
+        self.session.close()
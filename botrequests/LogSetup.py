@@ -0,0 +1,111 @@
+import os
+import sys
+import threading
+import time
+
+from loguru import logger
+
+from botrequests.Tracing import log_patcher
+
+
+# Фильтр записей журнала по уровню с настройкой для отдельных модулей
+# levels - словарь "модуль -> уровень", например {'botrequests.UserHistoryDB': 'WARNING'};
+# для записи выбирается настройка самого длинного совпадающего имени модуля, иначе - default
+class ModuleLevelFilter:
+
+    def __init__(self, default: str = 'INFO', levels: dict = None) -> None:
+        self.default = logger.level(default).no
+        self.levels = {name: logger.level(level).no for name, level in (levels or {}).items()}
+        self.cache = dict()
+
+    def level_for(self, name: str) -> int:
+        level = self.cache.get(name)
+        if level is None:
+            level = self.default
+            for prefix in sorted(self.levels, key=len, reverse=True):
+                if name == prefix or name.startswith(prefix + '.'):
+                    level = self.levels[prefix]
+                    break
+            self.cache[name] = level
+        return level
+
+    def __call__(self, record: dict) -> bool:
+        return record['level'].no >= self.level_for(record['name'] or '')
+
+    # разбор строки "модуль=уровень,модуль=уровень"
+    @staticmethod
+    def parse(text: str) -> dict:
+        levels = dict()
+        for item in text.split(','):
+            name, _, level = item.partition('=')
+            if name.strip() and level.strip():
+                levels[name.strip()] = level.strip().upper()
+        return levels
+
+
+# Класс ограничения частоты повторяющихся сообщений журнала
+# для каждого ключа в течение interval секунд записывается не более burst сообщений,
+# остальные подсчитываются; количество пропущенных сообщений записывается с первым сообщением
+# следующего интервала
+class LogSampler:
+
+    def __init__(self, interval: float = 60, burst: int = 5) -> None:
+        self.interval = interval
+        self.burst = burst
+        self.lock = threading.Lock()
+        self.windows = dict()   # ключ -> [начало интервала, записано, пропущено]
+
+    # проверка, нужно ли записать сообщение; возвращает (записать, пропущено в прошлом интервале)
+    def allow(self, key) -> tuple:
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            suppressed = 0
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                window = self.windows[key] = [now, 0, 0]
+            if window[1] < self.burst:
+                window[1] += 1
+                return True, suppressed
+            window[2] += 1
+            return False, 0
+
+    def log(self, level: str, key, message: str) -> None:
+        allowed, suppressed = self.allow(key)
+        if not allowed:
+            return
+        if suppressed:
+            message += f' (пропущено похожих сообщений: {suppressed})'
+        logger.opt(depth=2).log(level, message)
+
+    def warning(self, key, message: str) -> None:
+        self.log('WARNING', key, message)
+
+    def error(self, key, message: str) -> None:
+        self.log('ERROR', key, message)
+
+
+# Настройка журнала: вывод в консоль и файл через фоновый поток (enqueue), ротация файла со сжатием
+# старых частей, уровни для отдельных модулей; diagnose - значения переменных в трассировке исключений
+def setup_logging(file_name: str, level: str = 'INFO', module_levels: str = '', rotation: str = '10 MB',
+                  retention: str = '10', compression: str = 'zip', diagnose: bool = False,
+                  file_format: str = '{time}|{level}|{module}|{message}') -> None:
+    log_filter = ModuleLevelFilter(level, ModuleLevelFilter.parse(module_levels))
+    logger.remove()
+    logger.add(sys.stderr, level=0, filter=log_filter, enqueue=True, backtrace=False, diagnose=diagnose)
+    if file_name:
+        logger.add(file_name, format=file_format, level=0, filter=log_filter, enqueue=True, backtrace=True,
+                   diagnose=diagnose, rotation=rotation or None,
+                   retention=int(retention) if retention.isdigit() else retention or None,
+                   compression=compression or None)
+
+
+# Настройка журнала бота по переменным окружения LOG_* (общая для main.py и async_main.py):
+# в каждой записи - идентификатор трассировки сценария пользователя
+def setup_bot_logging() -> None:
+    logger.configure(extra={'trace_id': '-'}, patcher=log_patcher)
+    setup_logging(os.getenv('LOG_FILE', 'bot_logfile.log'), level=os.getenv('LOG_LEVEL', 'INFO'),
+                  module_levels=os.getenv('LOG_MODULE_LEVELS', ''), rotation=os.getenv('LOG_ROTATION', '10 MB'),
+                  retention=os.getenv('LOG_RETENTION', '10'), compression=os.getenv('LOG_COMPRESSION', 'zip'),
+                  diagnose=os.getenv('LOG_DIAGNOSE', '0') == '1',
+                  file_format='{time}|{level}|{module}|{extra[trace_id]}|{message}')
@@ -0,0 +1,253 @@
+import bisect
+import functools
+import inspect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+from loguru import logger
+
+# границы интервалов гистограмм времени выполнения по умолчанию, с
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    items = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        items.append(extra)
+    return '{' + ','.join(items) + '}' if items else ''
+
+
+def escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Базовый класс метрики: значения хранятся по наборам значений меток
+class Metric:
+    type_name = ''
+
+    def __init__(self, name: str, description: str, label_names: tuple = ()) -> None:
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.values = dict()
+        self.lock = threading.Lock()
+
+    def key(self, labels: dict) -> tuple:
+        return tuple(labels.get(i, '') for i in self.label_names)
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.type_name}']
+        with self.lock:
+            items = list(self.values.items())
+        for key, value in sorted(items):
+            lines.extend(self.render_value(key, value))
+        return lines
+
+    def render_value(self, key: tuple, value) -> list:
+        return [f'{self.name}{format_labels(self.label_names, key)} {format_value(value)}']
+
+
+# Счетчик: только увеличивается
+class Counter(Metric):
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+# Показатель, значение которого вычисляется функцией func при каждом запросе метрик
+class Gauge(Metric):
+    type_name = 'gauge'
+
+    def __init__(self, name: str, description: str, func: Callable) -> None:
+        super().__init__(name, description)
+        self.func = func
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.type_name}']
+        try:
+            lines.extend(self.render_value((), self.func()))
+        except Exception as e:
+            logger.error(f'Ошибка вычисления метрики <{self.name}>. {e}')
+        return lines
+
+
+# Счетчик, значение которого вычисляется функцией func (накопленное значение, которое только увеличивается)
+class ComputedCounter(Gauge):
+    type_name = 'counter'
+
+
+# Гистограмма: количество значений по интервалам, сумма и количество значений
+class Histogram(Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, description: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self.key(labels)
+        with self.lock:
+            data = self.values.get(key)
+            if data is None:
+                data = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            data[0][bisect.bisect_left(self.buckets, value)] += 1
+            data[1] += value
+            data[2] += 1
+
+    # количество значений и сумма для набора меток (для проверок и отчетов)
+    def summary(self, **labels) -> tuple:
+        with self.lock:
+            data = self.values.get(self.key(labels))
+            return (data[2], data[1]) if data else (0, 0.0)
+
+    def render_value(self, key: tuple, value) -> list:
+        counts, total, count = value
+        lines, cumulative = list(), 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = format_labels(self.label_names, key, f'le="{format_value(bound)}"')
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = format_labels(self.label_names, key)
+        lines.append(f'{self.name}_sum{labels} {format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+# Класс реестра метрик: создание метрик по имени и вывод в текстовом формате Prometheus
+# повторное обращение к метрике с тем же именем возвращает уже созданную метрику
+class MetricsRegistry:
+
+    def __init__(self) -> None:
+        self.metrics = dict()
+        self.lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable) -> Metric:
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = factory()
+            return metric
+
+    def counter(self, name: str, description: str = '', label_names: tuple = ()) -> Counter:
+        return self.register(name, lambda: Counter(name, description, label_names))
+
+    def histogram(self, name: str, description: str = '', label_names: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(name, lambda: Histogram(name, description, label_names, buckets))
+
+    # показатель с вычисляемым значением; при повторной регистрации функция заменяется
+    def gauge(self, name: str, description: str, func: Callable) -> Gauge:
+        gauge = self.register(name, lambda: Gauge(name, description, func))
+        gauge.func = func
+        return gauge
+
+    # счетчик с вычисляемым значением; при повторной регистрации функция заменяется
+    def computed_counter(self, name: str, description: str, func: Callable) -> ComputedCounter:
+        counter = self.register(name, lambda: ComputedCounter(name, description, func))
+        counter.func = func
+        return counter
+
+    # измерение времени выполнения блока кода: гистограмма name с метками labels
+    # и счетчик ошибок name_errors_total (если в блоке возникло исключение)
+    @contextmanager
+    def timer(self, name: str, description: str = '', **labels):
+        histogram = self.histogram(name, description, tuple(labels))
+        start = time.perf_counter()
+        try:
+            yield
+        except GeneratorExit:
+            raise
+        except BaseException:
+            self.counter(f'{name}_errors_total', 'Количество завершений с ошибкой', tuple(labels)).inc(**labels)
+            raise
+        finally:
+            histogram.observe(time.perf_counter() - start, **labels)
+
+    # декоратор измерения времени выполнения функции; для генераторов (в том числе асинхронных) измеряется
+    # время полной выдачи значений, для сопрограмм - время до их завершения
+    def timed(self, name: str, description: str = '', **labels) -> Callable:
+        def decorator(func: Callable) -> Callable:
+            if inspect.isgeneratorfunction(func):
+                @functools.wraps(func)
+                def generator_wrapper(*args, **kwargs):
+                    with self.timer(name, description, **labels):
+                        yield from func(*args, **kwargs)
+                return generator_wrapper
+            if inspect.isasyncgenfunction(func):
+                @functools.wraps(func)
+                async def async_generator_wrapper(*args, **kwargs):
+                    with self.timer(name, description, **labels):
+                        async for item in func(*args, **kwargs):
+                            yield item
+                return async_generator_wrapper
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def coroutine_wrapper(*args, **kwargs):
+                    with self.timer(name, description, **labels):
+                        return await func(*args, **kwargs)
+                return coroutine_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, description, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    # все метрики в текстовом формате Prometheus
+    def render(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = list()
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Обработчик запросов к HTTP-серверу метрик
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# Класс HTTP-сервера метрик: выдает метрики реестра по адресу /metrics
+class MetricsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, registry: MetricsRegistry, host: str = '127.0.0.1', port: int = 9100) -> None:
+        super().__init__((host, port), MetricsHandler)
+        self.registry = registry
+        self.thread = threading.Thread(target=self.serve_forever, name='metrics', daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+        logger.info(f'Метрики доступны по адресу http://{self.server_address[0]}:{self.server_address[1]}/metrics')
+
+
+# общий реестр метрик бота
+metrics = MetricsRegistry()
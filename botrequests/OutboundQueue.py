@@ -0,0 +1,256 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+import requests
+from loguru import logger
+from telebot.apihelper import ApiTelegramException
+
+from botrequests.Metrics import metrics
+from botrequests.Tracing import tracer
+
+# приоритеты отправки: короткие текстовые ответы отправляются раньше медиа-сообщений других чатов
+PRIORITY_TEXT = 0
+PRIORITY_MEDIA = 1
+
+
+# Класс ограничителя частоты запросов (token bucket): rate - запросов в секунду, burst - максимальный запас
+class TokenBucket:
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # время, когда будет доступен следующий запрос
+    def ready_at(self, now: float) -> float:
+        self.refill(now)
+        if self.tokens >= 1:
+            return now
+        return now + (1 - self.tokens) / self.rate
+
+    # расход одного запроса, возвращает время ожидания (с) до его выполнения
+    def consume(self, now: float) -> float:
+        self.refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+# Очередь сообщений одного чата
+class _ChatQueue:
+    __slots__ = ('chat_id', 'items', 'bucket', 'not_before', 'busy', 'scheduled')
+
+    def __init__(self, chat_id, rate: float, burst: float) -> None:
+        self.chat_id = chat_id
+        self.items = deque()
+        self.bucket = TokenBucket(rate, burst)
+        self.not_before = 0.0   # время, до которого отправка запрещена (retry_after от Telegram)
+        self.busy = False       # сообщение чата отправляется одним из потоков
+        self.scheduled = False  # чат находится в очереди на отправку
+
+
+# Класс очереди исходящих сообщений Telegram
+# сообщения одного чата отправляются строго по порядку, с ограничением частоты для каждого чата
+# и общей частоты отправки; при ответе 429 отправка в чат приостанавливается на retry_after секунд
+# отправку выполняют отдельные потоки, поэтому потоки обработки сообщений пользователей не ждут Telegram
+# ограничитель и пауза чата сохраняются после отправки всех его сообщений; при превышении max_chats
+# удаляются чаты без сообщений, запас которых полностью восстановлен и пауза retry_after истекла
+class OutboundQueue:
+
+    def __init__(self, workers: int = 4, global_rate: float = 30, chat_rate: float = 1, chat_burst: float = 3,
+                 max_retries: int = 3, max_chats: int = 10000) -> None:
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.global_lock = threading.Lock()
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+
+        self.cond = threading.Condition()
+        self.chats = dict()
+        self.ready = (deque(), deque())     # готовые к отправке чаты по приоритетам
+        self.delayed = list()               # куча (время готовности, приоритет, номер, чат)
+        self.counter = itertools.count()
+        self.pending = 0
+        self.stopped = False
+
+        self.workers = [threading.Thread(target=self.worker_loop, name=f'outbox_{i}', daemon=True)
+                        for i in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    # постановка вызова метода Telegram API в очередь отправки чата
+    def submit(self, chat_id, func: Callable, *args, priority: int = PRIORITY_TEXT, **kwargs) -> None:
+        with self.cond:
+            chat = self.chats.get(chat_id)
+            if chat is None:
+                if len(self.chats) >= self.max_chats:
+                    self.prune(time.monotonic())
+                chat = _ChatQueue(chat_id, self.chat_rate, self.chat_burst)
+                self.chats[chat_id] = chat
+            # контекст трассировки сохраняется, чтобы отправка была учтена в сценарии, который ее вызвал
+            chat.items.append([priority, func, args, kwargs, 0, time.monotonic(), contextvars.copy_context()])
+            self.pending += 1
+            if not chat.busy and not chat.scheduled:
+                self.schedule(chat, time.monotonic())
+
+    # количество сообщений, ожидающих отправки
+    def qsize(self) -> int:
+        return self.pending
+
+    # постановка чата в очередь готовых или отложенных чатов (вызывается под блокировкой)
+    def schedule(self, chat: _ChatQueue, now: float) -> None:
+        if not chat.items:
+            return
+        chat.scheduled = True
+        priority = chat.items[0][0]
+        ready_at = max(chat.bucket.ready_at(now), chat.not_before)
+        if ready_at <= now:
+            self.ready[priority].append(chat)
+        else:
+            heapq.heappush(self.delayed, (ready_at, priority, next(self.counter), chat))
+        self.cond.notify()
+
+    # удаление чатов без сообщений с восстановленным запасом и истекшей паузой (вызывается под блокировкой)
+    def prune(self, now: float) -> None:
+        idle = [chat_id for chat_id, chat in self.chats.items()
+                if not chat.items and not chat.busy and chat.not_before <= now
+                and chat.bucket.ready_at(now) <= now and chat.bucket.tokens >= chat.bucket.burst]
+        for chat_id in idle:
+            del self.chats[chat_id]
+
+    # выбор следующего чата для отправки (вызывается под блокировкой), None - при остановке очереди
+    def next_chat(self):
+        while True:
+            now = time.monotonic()
+            while self.delayed and self.delayed[0][0] <= now:
+                _, priority, _, chat = heapq.heappop(self.delayed)
+                self.ready[priority].append(chat)
+            for ready in self.ready:
+                if ready:
+                    return ready.popleft()
+            if self.stopped and not self.pending:
+                return None
+            self.cond.wait(self.delayed[0][0] - now if self.delayed else None)
+
+    def worker_loop(self) -> None:
+        while True:
+            with self.cond:
+                chat = self.next_chat()
+                if chat is None:
+                    return
+                chat.scheduled = False
+                chat.busy = True
+                item = chat.items.popleft()
+                chat.bucket.consume(time.monotonic())
+
+            # общее ограничение частоты отправки
+            with self.global_lock:
+                delay = self.global_bucket.consume(time.monotonic())
+            if delay:
+                time.sleep(delay)
+
+            retry_after = self.send(chat.chat_id, item)
+
+            with self.cond:
+                if retry_after is None:
+                    self.pending -= 1
+                else:
+                    # повтор отправки того же сообщения после паузы
+                    chat.items.appendleft(item)
+                    chat.not_before = time.monotonic() + retry_after
+                chat.busy = False
+                self.schedule(chat, time.monotonic())
+                if self.stopped:
+                    self.cond.notify_all()
+
+    # отправка сообщения, возвращает паузу (с) перед повтором или None, если повтор не нужен
+    def send(self, chat_id, item: list):
+        _, func, args, kwargs, attempt, submitted, context = item
+        if not attempt:
+            metrics.histogram('telegram_queue_wait_seconds', 'Время ожидания сообщения в очереди отправки').observe(
+                time.monotonic() - submitted)
+        try:
+            context.run(self.call, func, args, kwargs)
+        except ApiTelegramException as e:
+            if e.error_code == 429 and attempt < self.max_retries:
+                metrics.counter('telegram_retries_total', 'Повторы отправки сообщений', ('reason',)).inc(
+                    reason='429')
+                item[4] += 1
+                retry_after = (e.result_json or {}).get('parameters', {}).get('retry_after', 1)
+                logger.warning(f'Превышен лимит отправки сообщений в чат <{chat_id}>, пауза {retry_after} с')
+                return retry_after
+            logger.error(f'Ошибка отправки сообщения в чат <{chat_id}>. {e}')
+        except requests.RequestException as e:
+            if attempt < self.max_retries:
+                metrics.counter('telegram_retries_total', 'Повторы отправки сообщений', ('reason',)).inc(
+                    reason='connection')
+                item[4] += 1
+                logger.warning(f'Ошибка соединения при отправке сообщения в чат <{chat_id}>. {e}')
+                return 2 ** attempt
+            logger.error(f'Ошибка отправки сообщения в чат <{chat_id}>. {e}')
+        except Exception as e:
+            logger.error(f'Ошибка отправки сообщения в чат <{chat_id}>. {e}')
+        return None
+
+    # вызов метода Telegram API с измерением времени
+    @staticmethod
+    def call(func: Callable, args: tuple, kwargs: dict) -> None:
+        with tracer.span(f'telegram.{func.__name__}'), \
+                metrics.timer('telegram_request_seconds', 'Время запроса к Telegram Bot API', method=func.__name__):
+            func(*args, **kwargs)
+
+    # остановка очереди после отправки всех сообщений; timeout - общее время ожидания всех потоков
+    def stop(self, timeout: float = None) -> None:
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for worker in self.workers:
+            worker.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            if worker.is_alive():
+                logger.warning(f'Отправка сообщений не завершена за {timeout} с, осталось: {self.qsize()}')
+                return
+
+
+# Класс ограничения частоты отправки сообщений асинхронного бота
+# перед каждым запросом к Telegram ожидается разрешение общего ограничителя и ограничителя чата;
+# сообщения одного чата асинхронный бот отправляет последовательно, поэтому очередь не нужна;
+# при превышении max_chats удаляются ограничители чатов, запас которых полностью восстановлен
+class AsyncRateLimiter:
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, chat_burst: float = 3,
+                 max_chats: int = 10000) -> None:
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_chats = max_chats
+        self.chats = dict()
+
+    async def acquire(self, chat_id) -> None:
+        now = time.monotonic()
+        bucket = self.chats.get(chat_id)
+        if bucket is None:
+            if len(self.chats) >= self.max_chats:
+                self.prune(now)
+            bucket = self.chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        delay = max(bucket.consume(now), self.global_bucket.consume(now))
+        metrics.histogram('telegram_queue_wait_seconds', 'Время ожидания сообщения в очереди отправки').observe(delay)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def prune(self, now: float) -> None:
+        idle = [chat_id for chat_id, bucket in self.chats.items()
+                if bucket.ready_at(now) <= now and bucket.tokens >= bucket.burst]
+        for chat_id in idle:
+            del self.chats[chat_id]
@@ -0,0 +1,65 @@
+from typing import Sequence
+
+import numpy as np
+
+
+# Класс ранжирования отелей для /bestdeal по соотношению цены и расстояния до центра города
+# цена и расстояние приводятся к диапазону [0, 1] (min-max по кандидатам), оценка отеля -
+# взвешенная сумма price_weight * цена + distance_weight * расстояние, чем меньше - тем лучше
+# записи кандидатов должны иметь атрибуты price_value и distance (None - нет данных)
+class HotelRanker:
+
+    def __init__(self, price_weight: float = 0.5, distance_weight: float = 0.5) -> None:
+        self.price_weight = price_weight
+        self.distance_weight = distance_weight
+
+    # массивы цен и расстояний кандидатов, отсутствующие данные - nan
+    @staticmethod
+    def to_arrays(candidates: Sequence) -> tuple:
+        count = len(candidates)
+        prices = np.fromiter((np.nan if i.price_value is None else i.price_value for i in candidates),
+                             dtype=np.float64, count=count)
+        distances = np.fromiter((np.nan if i.distance is None else i.distance for i in candidates),
+                                dtype=np.float64, count=count)
+        return prices, distances
+
+    # приведение значений к диапазону [0, 1], при одинаковых значениях - 0
+    @staticmethod
+    def normalize(values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+        low = values[valid].min()
+        spread = values[valid].max() - low
+        return (values - low) / spread if spread > 0 else np.zeros_like(values)
+
+    # оценки кандидатов, для кандидатов без цены или расстояния - inf
+    def scores(self, prices: np.ndarray, distances: np.ndarray) -> np.ndarray:
+        valid = ~(np.isnan(prices) | np.isnan(distances))
+        result = np.full(prices.shape, np.inf)
+        if valid.any():
+            result[valid] = (self.price_weight * self.normalize(prices, valid)[valid]
+                             + self.distance_weight * self.normalize(distances, valid)[valid])
+        return result
+
+    # номера top лучших кандидатов в порядке возрастания оценки, при равных оценках - в исходном порядке
+    # частичная сортировка: argpartition отбирает top кандидатов, сортируются только они
+    def top_indexes(self, prices: np.ndarray, distances: np.ndarray, top: int) -> np.ndarray:
+        scores = self.scores(prices, distances)
+        top = min(top, int(np.isfinite(scores).sum()))
+        if top <= 0:
+            return np.empty(0, dtype=np.intp)
+        if top < len(scores):
+            # argpartition выбирает произвольных кандидатов среди равных граничной оценке,
+            # поэтому они отбираются отдельно - в исходном порядке кандидатов
+            cutoff = scores[np.argpartition(scores, top - 1)[top - 1]]
+            better = np.flatnonzero(scores < cutoff)
+            ties = np.flatnonzero(scores == cutoff)[:top - len(better)]
+            indexes = np.sort(np.concatenate((better, ties)))
+        else:
+            indexes = np.arange(len(scores))
+        return indexes[np.argsort(scores[indexes], kind='stable')]
+
+    # top лучших кандидатов в порядке возрастания оценки
+    def rank(self, candidates: Sequence, top: int) -> list:
+        if not candidates:
+            return list()
+        prices, distances = self.to_arrays(candidates)
+        return [candidates[i] for i in self.top_indexes(prices, distances, top)]
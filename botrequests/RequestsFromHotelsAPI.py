@@ -1,37 +1,47 @@
 import os
 import requests
 import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Iterator, NamedTuple, Optional
 from dotenv import load_dotenv
 from loguru import logger
 
-
-# Класс для хранения информации по отелям
-class HotelInfo:
-
-    def __init__(self) -> None:
-        self.hotel_name = ''
-        self.hotel_address = ''
-        self.distance_from_center = 0
-        self.price = 0
-        self.destination_id = None
-        self.hotel_image_url = list()
-        self.hotel_location = {'lat': 0.0, 'lon': 0.0}
-
-    def set_hotel_name(self, name: str) -> None:
-        self.hotel_name = name
-
-    def set_hotel_address(self, address: str) -> None:
-        self.hotel_address = address
-
-    def set_distance_from_center(self, distance: float) -> None:
-        self.distance_from_center = distance
-
-    def set_price(self, price: int) -> None:
-        self.price = price
-
-    def set_destination_id(self, dest_id: int) -> None:
-        self.destination_id = dest_id
+from botrequests.HttpClient import HttpClient
+from botrequests.Ranking import HotelRanker
+from botrequests.CityCache import CityCache
+from botrequests.GeoIndex import GeoIndex
+from botrequests.Metrics import metrics
+from botrequests.Tracing import tracer, submit
+from botrequests.LogSetup import LogSampler
+from botrequests.SearchCache import SearchCache
+from botrequests.SingleFlight import SingleFlight
+
+# быстрый разбор json (orjson), если библиотека установлена; иначе - стандартный модуль json
+# обе функции принимают байты ответа без предварительного декодирования в строку
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# ошибки разбора данных отелей повторяются для многих отелей ответа: не более 5 записей в минуту на вид ошибки
+parse_log = LogSampler(interval=60, burst=5)
+
+
+# Класс для хранения информации по отелям (неизменяемый, координаты хранятся отдельными полями)
+class HotelInfo(NamedTuple):
+    hotel_id: int = 0
+    hotel_name: str = ''
+    hotel_address: str = ''
+    distance_from_center: str = ''
+    distance: Optional[float] = None
+    price: str = ''
+    lat: float = 0.0
+    lon: float = 0.0
+    destination_id: Optional[int] = None
+    hotel_image_url: tuple = ()
 
     def __str__(self) -> str:
         return f'Название отеля: {self.hotel_name}\n' \
@@ -40,70 +50,414 @@ class HotelInfo:
                f'Цена: {self.price}'
 
 
-# Класс запросов к Hotel API
-class RequestToAPI:
+# Компактная запись с данными отеля из ответа properties/list (хранится в кэше результатов поиска)
+class HotelRecord(NamedTuple):
+    hotel_id: int
+    hotel_name: str
+    hotel_address: str
+    lat: float
+    lon: float
+    distance_from_center: str   # расстояние до центра в виде, полученном от API
+    distance: Optional[float]   # расстояние до центра, км; None - если нет данных
+    price: str
+    price_value: Optional[float]    # цена числом для ранжирования; None - если нет данных
+
+
+# План отбора отелей для вывода: строка запроса properties/list, количество запрашиваемых страниц,
+# готовые записи из локального индекса (None - нужен запрос к API), количество записей,
+# отбираемых со страниц результатов поиска, и признак ранжирования отобранных записей
+class SearchPlan(NamedTuple):
+    querystring: dict
+    max_pages: int
+    records: Optional[list]
+    limit: int
+    rank: bool
+
+
+# Общая часть синхронного и асинхронного классов запросов к Hotel API: настройки, кэши,
+# пространственный индекс, ранжирование, разбор ответов и отбор отелей (без сетевых запросов)
+class HotelsApiBase:
     # Загрузка параметров доступа к сайту из файла
     load_dotenv()
     headers = {
         'x-rapidapi-key': os.getenv('X_RAPIDAPI_KEY'),
         'x-rapidapi-host': "hotels4.p.rapidapi.com"
     }
-    url_locations = "https://hotels4.p.rapidapi.com/locations/search"
-    url_properties = "https://hotels4.p.rapidapi.com/properties/list"
-    url_photo = "https://hotels4.p.rapidapi.com/properties/get-hotel-photos"
+    # адрес API (может быть заменен адресом локального сервера для нагрузочного тестирования)
+    api_url = os.getenv('HOTELS_API_URL', 'https://hotels4.p.rapidapi.com').rstrip('/')
+    url_locations = f"{api_url}/locations/search"
+    url_properties = f"{api_url}/properties/list"
+    url_photo = f"{api_url}/properties/get-hotel-photos"
+    locale = "ru_RU"
+    # максимальное количество одновременных запросов фотографий
+    photo_workers = int(os.getenv('PHOTO_WORKERS', 8))
+    # параметры пула соединений с API: размер пула, таймауты (с), количество повторов
+    pool_size = int(os.getenv('API_POOL_SIZE', 10))
+    connect_timeout = float(os.getenv('API_CONNECT_TIMEOUT', 5))
+    read_timeout = float(os.getenv('API_READ_TIMEOUT', 20))
+    max_retries = int(os.getenv('API_MAX_RETRIES', 3))
+    # параметры кэша городов: время жизни найденных и ненайденных городов (с), размер кэша в памяти
+    city_cache_ttl = float(os.getenv('CITY_CACHE_TTL', 7 * 24 * 3600))
+    city_cache_negative_ttl = float(os.getenv('CITY_CACHE_NEGATIVE_TTL', 600))
+    city_cache_size = int(os.getenv('CITY_CACHE_SIZE', 1000))
+    # параметры кэша результатов поиска: время актуальности (с), время выдачи устаревших данных
+    # с фоновым обновлением (с), количество запросов в кэше
+    search_cache_ttl = float(os.getenv('SEARCH_CACHE_TTL', 300))
+    search_cache_stale_ttl = float(os.getenv('SEARCH_CACHE_STALE_TTL', 900))
+    search_cache_size = int(os.getenv('SEARCH_CACHE_SIZE', 500))
+    # максимальный размер страницы properties/list; для /bestdeal - лимит количества страниц
+    # и предварительный запрос следующей страницы
+    max_page_size = 25
+    bestdeal_max_pages = int(os.getenv('BESTDEAL_MAX_PAGES', 5))
+    bestdeal_prefetch = os.getenv('BESTDEAL_PREFETCH', '1') == '1'
+    # ранжирование /bestdeal по соотношению цены и расстояния: включение, веса цены и расстояния,
+    # количество кандидатов на один выводимый отель
+    bestdeal_ranking = os.getenv('BESTDEAL_RANKING', '1') == '1'
+    bestdeal_price_weight = float(os.getenv('BESTDEAL_PRICE_WEIGHT', 0.5))
+    bestdeal_distance_weight = float(os.getenv('BESTDEAL_DISTANCE_WEIGHT', 0.5))
+    bestdeal_candidates = int(os.getenv('BESTDEAL_CANDIDATES', 4))
+    # пространственный индекс отелей по городам: время хранения отелей (с), размер ячейки сетки (км),
+    # ответ /bestdeal без запроса к API, если ранее полученный полный список отелей города включает диапазон цен
+    geo_index_ttl = float(os.getenv('GEO_INDEX_TTL', 300))
+    geo_cell_km = float(os.getenv('GEO_CELL_KM', 1))
+    bestdeal_local_index = os.getenv('BESTDEAL_LOCAL_INDEX', '1') == '1'
 
     def __init__(self) -> None:
-        self.city_name = ''
-        self.dest_id = ''
+        # кэш destinationId городов
+        self.city_cache = CityCache(ttl=self.city_cache_ttl, negative_ttl=self.city_cache_negative_ttl,
+                                    maxsize=self.city_cache_size)
+        # кэш результатов поиска отелей
+        self.search_cache = SearchCache(ttl=self.search_cache_ttl, stale_ttl=self.search_cache_stale_ttl,
+                                        maxsize=self.search_cache_size)
+        # ранжирование результатов /bestdeal
+        self.ranker = HotelRanker(self.bestdeal_price_weight, self.bestdeal_distance_weight)
+        # центры городов и пространственные индексы полученных от API отелей
+        self.geo_index = GeoIndex(ttl=self.geo_index_ttl, cell_km=self.geo_cell_km)
+
+    # ключ объединения одинаковых одновременных запросов к API и имя метода API для метрик и трассировки
+    @staticmethod
+    def request_key(url: str, querystring: dict) -> tuple:
+        return url, tuple(sorted((key, str(value)) for key, value in querystring.items()))
+
+    def endpoint(self, url: str) -> str:
+        return url[len(self.api_url) + 1:]
+
+    # строка запроса locations/search для поиска города
+    def city_querystring(self, city_name: str) -> dict:
+        return {"query": f"{city_name}", "locale": self.locale, "pageSize": "25", 'type': 'CITY'}
+
+    # destinationId и координаты центра города из ответа locations/search, (None, None) - если город не найден
+    @classmethod
+    def parse_city(cls, response_dict: dict, city_name: str) -> tuple:
+        dest_id, center = None, None
+        for i_sugg in response_dict['suggestions']:
+            if i_sugg['group'] == 'CITY_GROUP':
+                for i_group in i_sugg['entities']:
+                    if i_group['name'].lower() == city_name.lower():
+                        dest_id = i_group['destinationId']
+                        center = cls.parse_center(i_group)
+        return dest_id, center
+
+    # сохранение результата поиска города в кэше и индексе, возвращает destinationId (0 - город не найден)
+    def store_city(self, city_name: str, dest_id, center: Optional[tuple]) -> int:
+        if dest_id:
+            self.city_cache.set(city_name, self.locale, int(dest_id), center)
+            if center:
+                self.geo_index.set_center(int(dest_id), *center)
+            return int(dest_id)
+        else:
+            logger.error(f'Запрошенный город <{city_name}> не найден')
+            self.city_cache.set(city_name, self.locale, 0)
+            return 0
+
+    # координаты центра города из ответа locations/search, None - если их нет
+    @staticmethod
+    def parse_center(entity: dict) -> Optional[tuple]:
+        try:
+            return float(entity['latitude']), float(entity['longitude'])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    # координаты центра города по destinationId (из индекса или кэша городов), None - если неизвестны
+    def city_center(self, dest_id: int) -> Optional[tuple]:
+        center = self.geo_index.center(dest_id)
+        if center is None:
+            center = self.city_cache.center(dest_id)
+            if center is not None:
+                self.geo_index.set_center(dest_id, *center)
+        return center
+
+    # формирование списка URL-фотографий в запрашиваемом количестве из ответа get-hotel-photos
+    @staticmethod
+    def parse_photos(response_dict: dict, number_of_photo: int) -> list:
+        result_list = list()
+        try:
+            for i_hotel_img in enumerate(response_dict['hotelImages'], 1):
+                if i_hotel_img[0] > number_of_photo:
+                    break
+                else:
+                    result_list += i_hotel_img[1]['baseUrl'].replace('{size}', 'y'),
+        except TypeError as e:
+            logger.error(f'Ошибка получения ссылок на фото отеля. {e}')
+        finally:
+            return result_list
+
+    # ключ кэша результатов поиска: параметры запроса без изменчивых полей (даты заезда/выезда)
+    @staticmethod
+    def search_cache_key(querystring: dict) -> tuple:
+        return tuple(sorted((key, str(value)) for key, value in querystring.items()
+                            if key not in ('checkIn', 'checkOut')))
+
+    # разбор данных одного отеля из ответа properties/list в компактную запись
+    @staticmethod
+    def parse_hotel(i_results: dict) -> HotelRecord:
+        # адрес
+        hotel_address = (f"{i_results['address'].get('locality', '')} "
+                         f"{i_results['address'].get('postalCode', '')} "
+                         f"{i_results['address'].get('streetAddress', '')}")
+
+        # координаты местоположеня отеля
+        try:
+            lat = float(i_results['coordinate'].get('lat', ''))
+            lon = float(i_results['coordinate'].get('lon', ''))
+        except (KeyError, ValueError):
+            lat, lon = 0.0, 0.0
+            parse_log.warning('coordinate', f'Ошибка чтения координат отеля <{i_results.get("id")}>')
+
+        # расстояние от отеля до центра города
+        distance_from_center, distance = 0, None
+        for i in i_results.get('landmarks', []):
+            try:
+                if i['label'] == 'City center' or i['label'] == 'Центр города':
+                    distance_from_center = i['distance']
+                    distance = float(i['distance'].split(' ')[0].replace(',', '.'))
+            except (KeyError, ValueError) as e:
+                distance_from_center = 'нет данных'
+                parse_log.warning('landmark', f'Ошибка получения расстояния до центра отеля '
+                                              f'<{i_results.get("id")}>. {type(e).__name__}: {e}')
+
+        # данные по цене
+        price_value = None
+        try:
+            price = i_results['ratePlan']['price']['current']
+            price_value = HotelsApiBase.parse_price(i_results['ratePlan']['price'])
+        except KeyError as e:
+            price = "нет данных"
+            parse_log.warning('price', f'Ошибка получения цены проживания отеля <{i_results.get("id")}>. '
+                                       f'Нет поля {e}')
+
+        return HotelRecord(int(i_results['id']), i_results['name'], hotel_address, lat, lon,
+                           distance_from_center, distance, price, price_value)
+
+    # цена числом: exactPrice или цифры из строки current (например, "$1,234")
+    @staticmethod
+    def parse_price(price_dict: dict) -> Optional[float]:
+        exact_price = price_dict.get('exactPrice')
+        if isinstance(exact_price, (int, float)):
+            return float(exact_price)
+        digits = ''.join(i for i in str(price_dict.get('current', '')) if i.isdigit() or i == '.')
+        try:
+            return float(digits)
+        except ValueError:
+            return None
+
+    # разбор ответа properties/list: записи отелей с расстояниями до центра, добавленные в индекс города
+    # None - если в ответе нет результатов поиска
+    def parse_properties(self, querystring: dict, response_dict: dict) -> Optional[list]:
+        try:
+            results = response_dict['data']['body']['searchResults']['results']
+        except (KeyError, TypeError):
+            logger.error(f'Ошибка получения данных API <{self.url_properties}>')
+            return None
+        dest_id = int(querystring['destinationId'])
+        records = self.fill_distances(dest_id, [self.parse_hotel(i_results) for i_results in results])
+        self.geo_index.add(dest_id, records)
+        return records
+
+    # расчет расстояния до центра города по координатам для отелей, у которых нет ориентира "Центр города"
+    # расстояния считаются одним векторным вызовом для всей страницы; если центр города неизвестен,
+    # записи не изменяются
+    def fill_distances(self, dest_id: int, records: list) -> list:
+        missing = [i for i, record in enumerate(records) if record.distance is None and (record.lat or record.lon)]
+        if not missing or self.city_center(dest_id) is None:
+            return records
+        distances = self.geo_index.distances(dest_id, [records[i] for i in missing])
+        if distances is None:
+            return records
+        for i, distance in zip(missing, distances.round(1).tolist()):
+            records[i] = records[i]._replace(distance=distance,
+                                             distance_from_center=f'{distance} км'.replace('.', ','))
+        return records
+
+    # строка запроса properties/list и максимальное количество запрашиваемых страниц
+    def search_querystring(self, dest_id, page_size: int, sort_order='PRICE', max_distance=0, min_price=0,
+                           max_price=0) -> tuple:
+        date = str(datetime.now()).split(" ")[0]
+        querystring = {"adults1": "1", "pageNumber": "1", "destinationId": f"{dest_id}", "pageSize": str(page_size),
+                       "checkOut": f"{date}", "checkIn": f"{date}", "sortOrder": f"{sort_order}", "locale": self.locale,
+                       "currency": "USD"}
+
+        if max_price > 0:
+            querystring['priceMin'] = str(min_price)
+            querystring['priceMax'] = str(max_price)
+
+        # для /bestdeal (задан диапазон расстояний) запрашиваются страницы максимального размера,
+        # пока не будет найдено page_size отелей в диапазоне или не будет достигнут лимит страниц
+        if max_distance > 0:
+            querystring['pageSize'] = str(self.max_page_size)
+            return querystring, self.bestdeal_max_pages
+        return querystring, 1
+
+    # план отбора отелей: для /bestdeal с ранжированием отбирается page_size * bestdeal_candidates кандидатов
+    # в диапазоне, из них выводятся page_size лучших по соотношению цены и расстояния;
+    # если все отели города в диапазоне цен уже получены от API (охват индекса), запрос к API не нужен
+    def search_plan(self, dest_id, page_size: int, sort_order='PRICE', min_distance=0, max_distance=0,
+                    min_price=0, max_price=0) -> SearchPlan:
+        querystring, max_pages = self.search_querystring(dest_id, page_size, sort_order, max_distance,
+                                                         min_price, max_price)
+        rank = max_distance > 0 and self.bestdeal_ranking
+        limit = page_size * self.bestdeal_candidates if rank else page_size
+        if max_distance > 0 and self.bestdeal_local_index:
+            local = self.local_candidates(int(dest_id), limit, min_distance, max_distance, min_price, max_price)
+            if local is not None:
+                records = self.ranker.rank(local, page_size) if rank else local
+                return SearchPlan(querystring, max_pages, records, page_size, False)
+        return SearchPlan(querystring, max_pages, None, limit, rank)
+
+    # не более limit самых дешевых отелей в диапазонах расстояний и цен из охвата индекса города
+    # (отбор - как со страниц результатов поиска, по расстоянию до центра из записи отеля)
+    # None - если охвата, включающего диапазон цен, нет и нужен запрос к API
+    def local_candidates(self, dest_id: int, limit: int, min_distance=0, max_distance=0,
+                         min_price=0, max_price=0) -> Optional[list]:
+        covered = self.geo_index.covering(dest_id, min_price, max_price)
+        if covered is None:
+            return None
+        candidates = [record for record in covered if self.in_distance_range(record, min_distance, max_distance)
+                      and (max_price <= 0 or record.price_value is not None
+                           and min_price <= record.price_value <= max_price)]
+        candidates.sort(key=lambda i: (i.price_value is None, i.price_value))
+        logger.info(f'Отели для города <{dest_id}> найдены в локальном индексе: {len(candidates)}')
+        return candidates[:limit]
+
+    # сохранение охвата после получения всех страниц результатов поиска (последняя страница неполная):
+    # отели города в диапазоне цен запроса известны полностью, в любом диапазоне расстояний
+    def store_coverage(self, querystring: dict, pages: list) -> None:
+        if self.bestdeal_local_index:
+            self.geo_index.cover(int(querystring['destinationId']), float(querystring.get('priceMin', 0)),
+                                 float(querystring.get('priceMax', 0)), [i for page in pages for i in page])
+
+    # отель с известным расстоянием до центра в диапазоне расстояний (max_distance = 0 - без ограничения)
+    @staticmethod
+    def in_distance_range(record: HotelRecord, min_distance=0, max_distance=0) -> bool:
+        if record.distance is None:
+            return False
+        return min_distance <= record.distance <= max_distance or max_distance == 0
+
+    # не более limit записей страницы результатов поиска в диапазоне расстояний до центра
+    @classmethod
+    def select_page(cls, records: list, limit: int, min_distance=0, max_distance=0) -> list:
+        selected = list()
+        for record in records:
+            if len(selected) >= limit:
+                break
+            if cls.in_distance_range(record, min_distance, max_distance):
+                selected.append(record)
+        return selected
+
+    # последняя страница результатов поиска: неполная страница или достигнут лимит страниц
+    @classmethod
+    def is_last_page(cls, records: list, querystring: dict, page_number: int, max_pages: int) -> bool:
+        return cls.is_complete(records, querystring) or page_number == max_pages
+
+    # неполная страница: результатов поиска больше нет
+    @staticmethod
+    def is_complete(records: list, querystring: dict) -> bool:
+        return len(records) < int(querystring['pageSize'])
+
+    # создание объекта с данными отеля из записи результатов поиска
+    @staticmethod
+    def hotel_from_record(record: HotelRecord) -> HotelInfo:
+        return HotelInfo(record.hotel_id, record.hotel_name, record.hotel_address, record.distance_from_center,
+                         record.distance, record.price, record.lat, record.lon)
+
+
+# Класс запросов к Hotel API
+# запросы выполняются через общий пул соединений requests, фотографии и следующие страницы
+# результатов поиска запрашиваются в пулах потоков
+class RequestToAPI(HotelsApiBase):
+
+    def __init__(self) -> None:
+        super().__init__()
+        # пул потоков для параллельной загрузки фотографий отелей
+        self.photo_executor = ThreadPoolExecutor(max_workers=self.photo_workers, thread_name_prefix='photo')
+        # пул потоков для предварительного запроса следующих страниц результатов поиска
+        self.page_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='page')
+        # общий HTTP-клиент с пулом постоянных соединений
+        self.http = HttpClient(self.headers, pool_size=max(self.pool_size, self.photo_workers),
+                               connect_timeout=self.connect_timeout, read_timeout=self.read_timeout,
+                               max_retries=self.max_retries)
+        # объединение одинаковых одновременных запросов к API
+        self.single_flight = SingleFlight()
+
+    # GET-запрос к API с преобразованием ответа из json в словарь
+    # одинаковые одновременные запросы выполняются одним обращением к серверу
+    def get_json(self, url: str, querystring: dict) -> dict:
+        def request() -> dict:
+            endpoint = self.endpoint(url)
+            with tracer.span(f'http.{endpoint}', params=querystring), \
+                    metrics.timer('hotels_api_request_seconds', 'Время запроса к Hotels API', endpoint=endpoint):
+                return json_loads(self.http.get(url, params=querystring).content)
+        return self.single_flight.do(self.request_key(url, querystring), request)
 
     # метод поиска dectination_id города по его названию
+    @tracer.traced('api.city_search')
     def city_search(self, city_name: str) -> int:
-        self.dest_id = None
-        self.city_name = city_name
+        # поиск города в кэше
+        found, cached_id = self.city_cache.get(city_name, self.locale)
+        if found:
+            logger.info(f'Город <{city_name}> найден в кэше: {cached_id}. {self.city_cache.stats()}')
+            return cached_id
 
         # Формирование строки запроса к API, получение данных в формате json
         # преобразование полученного ответа в словарь
-        querystring = {"query": f"{self.city_name}", "locale": "ru_RU", "pageSize": "25", 'type': 'CITY'}
-        response = requests.request("GET", self.url_locations, headers=self.headers, params=querystring)
-        response_dict = json.loads(response.text)
+        querystring = self.city_querystring(city_name)
+        try:
+            response_dict = self.get_json(self.url_locations, querystring)
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f'Ошибка запроса к API <{self.url_locations}>. {e}')
+            return 0
 
         # получение из словаря с результатами данных по ключу destinationId
         try:
-            for i_sugg in response_dict['suggestions']:
-                if i_sugg['group'] == 'CITY_GROUP':
-                    for i_group in i_sugg['entities']:
-                        if i_group['name'].lower() == self.city_name.lower():
-                            self.dest_id = i_group['destinationId']
+            dest_id, center = self.parse_city(response_dict, city_name)
         except KeyError:
             logger.error(f'Ошибка получения данных API <{response_dict}>')
-
-        if self.dest_id:
-            return int(self.dest_id)
-        else:
-            logger.error(f'Запрошенный город <{city_name}> не найден')
             return 0
+        return self.store_city(city_name, dest_id, center)
 
     # метод поиска фотографий отеля по его id
+    @tracer.traced('api.get_hotels_photo')
     def get_hotels_photo(self, hotel_id: int, number_of_photo: int = 25) -> list:
-        result_list = list()
-
         # Формирование строки запроса к API, получение данных в формате json
         # преобразование полученного ответа в словарь
         querystring = {"id": str(hotel_id)}
-        response = requests.request("GET", self.url_photo, headers=self.headers, params=querystring)
-        response_dict = json.loads(response.text)
+        try:
+            response_dict = self.get_json(self.url_photo, querystring)
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f'Ошибка запроса к API <{self.url_photo}>. {e}')
+            return list()
+
+        return self.parse_photos(response_dict, number_of_photo)
 
-        # формирование списка URL-фотографий в запрашиваемом количестве
+    # запрос списка отелей properties/list, результат - список компактных записей HotelRecord
+    # None - если данные от API не получены
+    def properties_list(self, querystring: dict) -> Optional[list]:
         try:
-            for i_hotel_img in enumerate(response_dict['hotelImages'], 1):
-                if i_hotel_img[0] > number_of_photo:
-                    break
-                else:
-                    result_list += i_hotel_img[1]['baseUrl'].replace('{size}', 'y'),
-        except TypeError as e:
-            logger.error(f'Ошибка получения ссылок на фото отеля. {e}')
-        finally:
-            return result_list
+            response_dict = self.get_json(self.url_properties, querystring)
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f'Ошибка запроса к API <{self.url_properties}>. {e}')
+            return None
+        return self.parse_properties(querystring, response_dict)
 
     # метод поиска отелей
     # входные данные:   destinationId отеля, количество отелей, способ сортировки результата
@@ -111,72 +465,81 @@ class RequestToAPI:
     #                   количество URL-ссылок на фото
     def hotels_search(self, dest_id, page_size: int, sort_order='PRICE', min_distance=0, max_distance=0,
                       min_price=0, max_price=0, hotel_photo=0) -> list:
-
-        # формирование строки запроса к API
-        date = str(datetime.now()).split(" ")[0]
-        querystring = {"adults1": "1", "pageNumber": "1", "destinationId": f"{dest_id}", "pageSize": {page_size},
-                       "checkOut": f"{date}", "checkIn": f"{date}", "sortOrder": f"{sort_order}", "locale": "ru_RU",
-                       "currency": "USD"}
-
-        if max_price > 0:
-            querystring['priceMin'] = str(min_price)
-            querystring['priceMax'] = str(max_price)
-
-        # получение  ответа сервера
-        response = requests.request("GET", self.url_properties, headers=self.headers, params=querystring)
-        response_dict = json.loads(response.text)
-
-        # анализ полученных данных
-        result_list = []
-        for i_results in response_dict['data']['body']['searchResults']['results']:
-            # сброс флага проверки диапазона расстояний до центра города
-            check_distance = False
-
-            # создание объекта для сохранения данных отеля отеля
-            curr_hotel = HotelInfo()
-            curr_hotel.hotel_name = i_results["name"] # название отеля
-
-            # адрес
-            curr_hotel.hotel_address = (f"{i_results['address'].get('locality', '')} "
-                                        f"{i_results['address'].get('postalCode', '')} "
-                                        f"{i_results['address'].get('streetAddress', '')}")
-
-            # получение списка URL-фотографий отеля
-            curr_hotel.hotel_image_url = self.get_hotels_photo(hotel_id=int(i_results['id']),
-                                                               number_of_photo=hotel_photo)
-            # координаты местоположеня отеля
-            try:
-                curr_hotel.hotel_location['lat'] = float(i_results['coordinate'].get('lat', ''))
-                curr_hotel.hotel_location['lon'] = float(i_results['coordinate'].get('lon', ''))
-            except ValueError:
-                curr_hotel.hotel_location['lat'] = 0
-                curr_hotel.hotel_location['lon'] = 0
-                logger.exception('Ошибка чтения координат')
-
-            # расстояние от отеля до центра города
-            for i in i_results['landmarks']:
-                try:
-                    if i['label'] == 'City center' or i['label'] == 'Центр города':
-                        curr_hotel.distance_from_center = i['distance']
-                        distance = i['distance'].split(' ')[0].replace(',', '.')
-
-                        # проверка на вхождение отеля в заданный диапазон расстояний от центра города
-                        if min_distance <= float(distance) <= max_distance or max_distance == 0:
-                            check_distance = True
-                except KeyError:
-                    curr_hotel.distance_from_center = 'нет данных'
-                    logger.exception('Ошибка получения расстояния до центра')
-
-            # данные по цене
+        return list(self.hotels_search_iter(dest_id, page_size, sort_order=sort_order, min_distance=min_distance,
+                                            max_distance=max_distance, min_price=min_price, max_price=max_price,
+                                            hotel_photo=hotel_photo))
+
+    # потоковый вариант поиска отелей: отели выдаются по одному, как только получены их данные
+    # (и фотографии, если они запрошены), в порядке результатов поиска
+    @tracer.traced('api.hotels_search')
+    def hotels_search_iter(self, dest_id, page_size: int, sort_order='PRICE', min_distance=0, max_distance=0,
+                           min_price=0, max_price=0, hotel_photo=0) -> Iterator[HotelInfo]:
+
+        plan = self.search_plan(dest_id, page_size, sort_order, min_distance, max_distance, min_price, max_price)
+        records = plan.records
+        if records is None:
+            records = self.select_records(plan.querystring, plan.max_pages, plan.limit, min_distance, max_distance)
+            if plan.rank:
+                records = self.ranker.rank(list(records), page_size)
+
+        # фотографии запрашиваются сразу для каждого отобранного отеля,
+        # отели выдаются по порядку, как только получены их фотографии
+        pending = deque()
+        for record in records:
+            curr_hotel = self.hotel_from_record(record)
+            future = None
+            if hotel_photo > 0:
+                future = submit(self.photo_executor, self.get_hotels_photo, curr_hotel.hotel_id, hotel_photo)
+            pending.append((curr_hotel, future))
+            while pending and (pending[0][1] is None or pending[0][1].done()):
+                yield self.attach_photo(*pending.popleft())
+        while pending:
+            yield self.attach_photo(*pending.popleft())
+
+    # отбор записей отелей по расстоянию до центра города со страниц результатов поиска
+    def select_records(self, querystring: dict, max_pages: int, page_size: int, min_distance=0,
+                       max_distance=0) -> Iterator[HotelRecord]:
+        count = 0
+        for records in self.properties_pages(querystring, max_pages):
+            selected = self.select_page(records, page_size - count, min_distance, max_distance)
+            yield from selected
+            count += len(selected)
+            if count >= page_size:
+                return
+
+    # последовательное получение страниц результатов поиска (из кэша или от сервера)
+    # пока обрабатывается текущая страница, следующая запрашивается заранее (если включено bestdeal_prefetch);
+    # если получены все страницы, их отели сохраняются как охват индекса города
+    def properties_pages(self, querystring: dict, max_pages: int) -> Iterator[list]:
+        def fetch(page_number: int) -> Optional[list]:
+            page_querystring = dict(querystring, pageNumber=str(page_number))
+            return self.search_cache.get_or_fetch(self.search_cache_key(page_querystring),
+                                                  lambda: self.properties_list(page_querystring))
+
+        next_page, pages = None, list()
+        for page_number in range(1, max_pages + 1):
+            records = next_page.result() if next_page else fetch(page_number)
+            next_page = None
+            if not records:
+                if records is not None:
+                    self.store_coverage(querystring, pages)
+                return
+            last_page = self.is_last_page(records, querystring, page_number, max_pages)
+            if self.bestdeal_prefetch and not last_page:
+                next_page = submit(self.page_executor, fetch, page_number + 1)
+            pages.append(records)
+            yield records
+            if self.is_complete(records, querystring):
+                self.store_coverage(querystring, pages)
+            if last_page:
+                return
+
+    # добавление к отелю списка URL-фотографий из результата параллельного запроса
+    @staticmethod
+    def attach_photo(curr_hotel: HotelInfo, future) -> HotelInfo:
+        if future is not None:
             try:
-                curr_hotel.price = i_results['ratePlan']['price']['current']
-            except KeyError:
-                curr_hotel.price = "нет данных"
-                logger.exception('Ошибка получения цены проживания')
-
-            # добавление отеля в список результатов, если выполняется условие по расстоянию
-            if check_distance and page_size > 0:
-                result_list.append(curr_hotel)
-                page_size -= 1
-
-        return result_list
+                curr_hotel = curr_hotel._replace(hotel_image_url=tuple(future.result()))
+            except Exception as e:
+                logger.error(f'Ошибка получения фото отеля <{curr_hotel.hotel_id}>. {e}')
+        return curr_hotel
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from loguru import logger
+
+
+# Класс кэша результатов поиска отелей с выдачей устаревших данных и их фоновым обновлением
+# (stale-while-revalidate)
+# ttl - время, в течение которого данные считаются актуальными
+# stale_ttl - время после истечения ttl, в течение которого выдаются устаревшие данные,
+#             а в фоне выполняется повторный запрос
+class SearchCache:
+
+    def __init__(self, ttl: float = 300, stale_ttl: float = 900, maxsize: int = 500) -> None:
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.refreshing = set()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cache_refresh')
+        # счетчики: актуальные данные, устаревшие данные, промахи
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    # получение значения из кэша или с помощью функции fetch
+    # результат fetch, равный None (ошибка запроса), в кэше не сохраняется
+    def get_or_fetch(self, key, fetch: Callable):
+        found, value, refresh = self.lookup(key)
+        if refresh:
+            self.executor.submit(self.refresh, key, fetch)
+        if found:
+            return value
+
+        value = fetch()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    # поиск значения в кэше: (найдено, значение, нужно фоновое обновление)
+    # фоновое обновление требуется для устаревшего значения, если оно еще не выполняется;
+    # по его окончании вызывается release
+    def lookup(self, key) -> tuple:
+        with self.lock:
+            item = self.data.get(key)
+            if item is not None:
+                value, stored = item
+                age = time.time() - stored
+                if age < self.ttl:
+                    self.hits += 1
+                    self.data.move_to_end(key)
+                    return True, value, False
+                if age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    self.data.move_to_end(key)
+                    refresh = key not in self.refreshing
+                    self.refreshing.add(key)
+                    return True, value, refresh
+                del self.data[key]
+            self.misses += 1
+            return False, None, False
+
+    def set(self, key, value) -> None:
+        with self.lock:
+            self.data[key] = (value, time.time())
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    # фоновое обновление устаревшей записи
+    def refresh(self, key, fetch: Callable) -> None:
+        try:
+            value = fetch()
+            if value is not None:
+                self.set(key, value)
+        except Exception as e:
+            logger.error(f'Ошибка фонового обновления кэша поиска. {e}')
+        finally:
+            self.release(key)
+
+    # окончание фонового обновления записи
+    def release(self, key) -> None:
+        with self.lock:
+            self.refreshing.discard(key)
+
+    # статистика использования кэша
+    def stats(self) -> dict:
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.stale_hits) / total if total else 0.0,
+            'size': len(self.data)
+        }
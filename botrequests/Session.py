@@ -1,9 +1,20 @@
 from loguru import logger
 import time
 
+from botrequests.Tracing import new_trace_id
+
 
 # Класс для хранения информации о сессии пользователя
+# атрибуты объявлены в __slots__: объект без __dict__ занимает меньше памяти
 class User:
+    __slots__ = ('user_id', 'username', 'user_first_name', 'user_last_name', 'status', 'scenario', 'city_name',
+                 'destination_id', 'page_size', 'min_price', 'max_price', 'min_distance', 'max_distance',
+                 'datetime', 'chat_id', 'numb_photo', 'result_list', 'last_access', 'trace_id', 'step')
+    # поля, сохраняемые в хранилище состояния диалогов (результаты поиска и время обращения не сохраняются)
+    state_fields = ('user_id', 'username', 'user_first_name', 'user_last_name', 'status', 'scenario', 'city_name',
+                    'destination_id', 'page_size', 'min_price', 'max_price', 'min_distance', 'max_distance',
+                    'datetime', 'chat_id', 'numb_photo', 'trace_id', 'step')
+
     def __init__(self, message):
         self.user_id = message.from_user.id
         self.username = message.from_user.username
@@ -21,6 +32,26 @@ class User:
         self.datetime = time.time()
         self.chat_id = 0
         self.numb_photo = 0
+        self.result_list = list()
+        self.last_access = time.monotonic()
+        # идентификатор трассировки текущего сценария
+        self.trace_id = new_trace_id()
+        # имя обработчика следующего сообщения пользователя ('' - начало сценария)
+        self.step = ''
+
+    # данные сессии для хранилища состояния диалогов
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.state_fields}
+
+    # восстановление сессии из данных хранилища состояния, KeyError - если данных недостаточно
+    @classmethod
+    def from_dict(cls, data: dict) -> 'User':
+        user = cls.__new__(cls)
+        for name in cls.state_fields:
+            setattr(user, name, data[name])
+        user.result_list = list()
+        user.last_access = time.monotonic()
+        return user
 
     # метод сохранения цены отеля
     def set_price(self, input_text: str) -> bool:
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+from typing import Callable
+
+
+# Данные одного выполняющегося вызова
+class _Call:
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Класс объединения одинаковых одновременных вызовов (single-flight):
+# пока вызов с заданным ключом выполняется, остальные потоки с тем же ключом
+# ожидают его завершения и получают тот же результат (или то же исключение)
+class SingleFlight:
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.calls = dict()
+        # количество вызовов, объединенных с уже выполняющимися
+        self.coalesced = 0
+
+    def do(self, key, fn: Callable):
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self.calls[key] = call
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.event.set()
+        return call.result
+
+
+# Асинхронный вариант SingleFlight: fn - функция, возвращающая сопрограмму;
+# вызов выполняется отдельной задачей, поэтому отмена одного из ожидающих не отменяет его для остальных
+class AsyncSingleFlight:
+
+    def __init__(self) -> None:
+        self.calls = dict()
+        self.coalesced = 0
+
+    async def do(self, key, fn: Callable):
+        task = self.calls.get(key)
+        if task is None:
+            task = self.calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self.calls.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
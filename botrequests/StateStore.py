@@ -0,0 +1,295 @@
+from contextlib import contextmanager
+from loguru import logger
+from typing import Optional
+import importlib
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from botrequests.Session import User
+
+
+# Интерфейс хранилища состояния диалогов: для каждого пользователя (чата) хранится словарь данных сессии,
+# включая имя обработчика следующего сообщения. Хранилище может быть общим для нескольких процессов бота.
+# Другие варианты хранилища (Redis, сетевая БД) реализуют эти методы и подключаются через STATE_BACKEND
+class StateBackend:
+
+    # данные сессии пользователя, None - если состояние не сохранено
+    def load(self, user_id: int) -> Optional[dict]:
+        raise NotImplementedError
+
+    def save(self, user_id: int, state: dict) -> None:
+        raise NotImplementedError
+
+    def delete(self, user_id: int) -> None:
+        raise NotImplementedError
+
+    # удаление состояний, не изменявшихся дольше idle_timeout (с), и самых старых состояний сверх max_states,
+    # возвращает список id пользователей удаленных состояний
+    def expire(self, idle_timeout: float, max_states: int) -> list:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+# Хранилище состояния в памяти процесса (один процесс бота, состояние не сохраняется при перезапуске)
+class MemoryStateBackend(StateBackend):
+
+    def __init__(self) -> None:
+        self.states = dict()
+        self.lock = threading.Lock()
+
+    def load(self, user_id: int) -> Optional[dict]:
+        with self.lock:
+            item = self.states.get(user_id)
+        return json.loads(item[0]) if item else None
+
+    def save(self, user_id: int, state: dict) -> None:
+        data = json.dumps(state, ensure_ascii=False)
+        with self.lock:
+            # последние измененные состояния - в конце словаря
+            self.states.pop(user_id, None)
+            self.states[user_id] = (data, time.time())
+
+    def delete(self, user_id: int) -> None:
+        with self.lock:
+            self.states.pop(user_id, None)
+
+    def expire(self, idle_timeout: float, max_states: int) -> list:
+        deadline = time.time() - idle_timeout
+        expired = list()
+        with self.lock:
+            overflow = len(self.states) - max_states
+            for user_id, (_, updated) in self.states.items():
+                if updated > deadline and len(expired) >= overflow:
+                    break
+                expired.append(user_id)
+            for user_id in expired:
+                del self.states[user_id]
+        return expired
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+
+# Хранилище состояния в файле SQLite: состояние сохраняется при перезапуске бота,
+# файл может использоваться одновременно несколькими процессами бота (режим WAL, ожидание блокировки)
+class SqliteStateBackend(StateBackend):
+
+    def __init__(self, file_name: str = 'ChatState.sqlite3', busy_timeout: float = 5.0) -> None:
+        self.BASE_DIR = os.getenv('BOT_DATA_DIR', os.path.dirname(os.path.abspath(__file__)))
+        self.db_path = os.path.join(self.BASE_DIR, file_name)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.db_path, timeout=busy_timeout, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL;")
+        self.connection.execute("PRAGMA synchronous=NORMAL;")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS chat_state (
+                                    user_id INTEGER PRIMARY KEY,
+                                    state TEXT NOT NULL,
+                                    updated REAL NOT NULL);""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS chat_state_updated ON chat_state (updated);")
+        self.connection.commit()
+
+    def load(self, user_id: int) -> Optional[dict]:
+        with self.lock:
+            row = self.connection.execute("SELECT state FROM chat_state WHERE user_id = ?;",
+                                          (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, user_id: int, state: dict) -> None:
+        data = json.dumps(state, ensure_ascii=False)
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO chat_state (user_id, state, updated) VALUES (?, ?, ?);",
+                                    (user_id, data, time.time()))
+            self.connection.commit()
+
+    def delete(self, user_id: int) -> None:
+        with self.lock:
+            self.connection.execute("DELETE FROM chat_state WHERE user_id = ?;", (user_id,))
+            self.connection.commit()
+
+    def expire(self, idle_timeout: float, max_states: int) -> list:
+        with self.lock:
+            expired = [row[0] for row in self.connection.execute(
+                """SELECT user_id FROM chat_state WHERE updated < ?
+                   UNION
+                   SELECT user_id FROM (SELECT user_id FROM chat_state ORDER BY updated DESC LIMIT -1 OFFSET ?);""",
+                (time.time() - idle_timeout, max_states))]
+            if expired:
+                self.connection.executemany("DELETE FROM chat_state WHERE user_id = ?;",
+                                            [(user_id,) for user_id in expired])
+                self.connection.commit()
+        return expired
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM chat_state;").fetchone()[0]
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+
+# Создание хранилища состояния по настройке: 'sqlite', 'memory' или путь к классу в формате 'module:Class'
+def create_backend(spec: str = 'sqlite') -> StateBackend:
+    if spec == 'sqlite':
+        return SqliteStateBackend()
+    if spec == 'memory':
+        return MemoryStateBackend()
+    module_name, _, class_name = spec.partition(':')
+    if not class_name:
+        raise ValueError(f'Неизвестное хранилище состояния <{spec}>')
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+# Класс хранилища сессий пользователей поверх StateBackend
+# сессия загружается из хранилища в начале обработки сообщения (load) и сохраняется в конце (release),
+# между сообщениями состояние процесса не используется - следующее сообщение может обработать другой процесс
+# idle_timeout - время бездействия (с), после которого состояние удаляется очисткой;
+# max_sessions - количество сессий: при сохранении новой сессии сверх лимита удаляются самые старые
+class PersistentSessionStore:
+    def __init__(self, backend: StateBackend, idle_timeout: float = 1800, max_sessions: int = 10000) -> None:
+        self.backend = backend
+        # сессии сообщений, обрабатываемых в данный момент, и id новых (еще не сохраненных) сессий
+        self.active = dict()
+        self.created = set()
+        self.lock = threading.Lock()
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.sweeper = None
+        self.sweeper_stop = threading.Event()
+
+    # чтение сессии из хранилища, None - если состояние не сохранено или не может быть восстановлено
+    def read(self, user_id: int) -> Optional[User]:
+        try:
+            state = self.backend.load(user_id)
+            return User.from_dict(state) if state is not None else None
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f'Состояние сессии пользователя <{user_id}> не восстановлено. {e}')
+            return None
+
+    # загрузка сессии для обработки сообщения, создание новой сессии при ее отсутствии
+    def load(self, message) -> User:
+        user = self.read(message.from_user.id)
+        created = user is None
+        if created:
+            user = User(message)
+        with self.lock:
+            self.active[user.user_id] = user
+            if created:
+                self.created.add(user.user_id)
+        return user
+
+    # сохранение сессии после обработки сообщения (если сессия не удалена обработчиком)
+    def release(self, user_id: int) -> None:
+        with self.lock:
+            user = self.active.pop(user_id, None)
+            created = user_id in self.created
+            self.created.discard(user_id)
+        if user is not None:
+            self.backend.save(user_id, user.to_dict())
+            if created:
+                self.trim()
+
+    # получение сессии пользователя, None - если сессии нет
+    def get(self, user_id: int) -> Optional[User]:
+        with self.lock:
+            user = self.active.get(user_id)
+        return user if user is not None else self.read(user_id)
+
+    # получение сессии пользователя, создание новой сессии при ее отсутствии
+    def get_or_create(self, message) -> User:
+        with self.lock:
+            user = self.active.get(message.from_user.id)
+        return user if user is not None else self.load(message)
+
+    # удаление сессии пользователя, возвращает удаленную сессию или None
+    def pop(self, user_id: int) -> Optional[User]:
+        with self.lock:
+            user = self.active.pop(user_id, None)
+            self.created.discard(user_id)
+        if user is None:
+            user = self.read(user_id)
+        self.backend.delete(user_id)
+        return user
+
+    # удаление самых старых сессий сверх max_sessions, возвращает количество удаленных сессий
+    def trim(self) -> int:
+        try:
+            if len(self.backend) <= self.max_sessions:
+                return 0
+            expired = self.backend.expire(math.inf, self.max_sessions)
+        except Exception as e:
+            logger.error(f'Ошибка ограничения количества сессий. {e}')
+            return 0
+        logger.debug(f'Удалено старых сессий сверх лимита: {len(expired)}')
+        return len(expired)
+
+    # удаление неактивных сессий из хранилища, возвращает количество удаленных сессий
+    def sweep(self) -> int:
+        try:
+            expired = self.backend.expire(self.idle_timeout, sys.maxsize)
+        except Exception as e:
+            logger.error(f'Ошибка очистки хранилища состояния. {e}')
+            return 0
+        if expired:
+            logger.info(f'Удалено неактивных сессий: {len(expired)}, активных сессий: {len(self)}')
+        return len(expired)
+
+    # запуск потока периодической очистки неактивных сессий
+    def start_sweeper(self, interval: float = 60) -> None:
+        if self.sweeper is None:
+            self.sweeper = threading.Thread(target=self.sweeper_loop, args=(interval,), name='session_sweeper',
+                                            daemon=True)
+            self.sweeper.start()
+
+    def sweeper_loop(self, interval: float) -> None:
+        while not self.sweeper_stop.wait(interval):
+            self.sweep()
+
+    def stop_sweeper(self) -> None:
+        self.sweeper_stop.set()
+
+    def close(self) -> None:
+        self.stop_sweeper()
+        self.backend.close()
+
+    def __len__(self) -> int:
+        return len(self.backend)
+
+
+# Блокировки по id чата (пользователя): сообщения одного чата обрабатываются по порядку,
+# сообщения разных чатов - независимо
+# блокировка чата удаляется, когда ее не удерживает и не ожидает ни один поток
+class ChatLocks:
+    def __init__(self) -> None:
+        # id чата -> [блокировка, количество потоков, удерживающих или ожидающих блокировку]
+        self.locks = dict()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def hold(self, chat_id: int):
+        with self.lock:
+            item = self.locks.get(chat_id)
+            if item is None:
+                item = self.locks[chat_id] = [threading.Lock(), 0]
+            item[1] += 1
+        try:
+            with item[0]:
+                yield
+        finally:
+            with self.lock:
+                item[1] -= 1
+                if item[1] == 0:
+                    del self.locks[chat_id]
+
+    def __len__(self) -> int:
+        return len(self.locks)
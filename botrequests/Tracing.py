@@ -0,0 +1,272 @@
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from loguru import logger
+
+# идентификатор трассировки (сценария поиска) и текущий интервал в контексте выполнения
+trace_id_var = contextvars.ContextVar('trace_id', default=None)
+span_var = contextvars.ContextVar('span', default=None)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+# добавление идентификатора трассировки в записи журнала loguru (поле extra[trace_id])
+def log_patcher(record: dict) -> None:
+    record['extra']['trace_id'] = trace_id_var.get() or '-'
+
+
+# запуск функции в пуле потоков с текущим контекстом трассировки
+def submit(executor, fn: Callable, *args, **kwargs):
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+# Интервал трассировки: именованный участок выполнения с временем начала и длительностью
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'attrs', 'start', 'started', 'duration', 'error',
+                 'thread', 'profile')
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, attrs: dict, profile: bool) -> None:
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.error = None
+        self.thread = threading.current_thread().name
+        self.profile = profile
+
+    def to_json(self) -> str:
+        data = {'trace_id': self.trace_id, 'span_id': self.span_id, 'parent_id': self.parent_id, 'name': self.name,
+                'start': round(self.start, 6), 'duration_ms': round(self.duration * 1000, 3), 'thread': self.thread}
+        if self.attrs:
+            data['attrs'] = self.attrs
+        if self.error:
+            data['error'] = self.error
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+# Класс записи интервалов в файл JSONL (одна строка json на интервал) отдельным потоком
+class JsonlExporter:
+
+    def __init__(self, file_name: str) -> None:
+        self.file_name = file_name
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.writer_loop, name='trace_export', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def export(self, span: Span) -> None:
+        self.queue.put(span)
+
+    def writer_loop(self) -> None:
+        with open(self.file_name, 'a', encoding='utf-8') as file:
+            while True:
+                span = self.queue.get()
+                if span is None:
+                    return
+                file.write(span.to_json() + '\n')
+                if self.queue.empty():
+                    file.flush()
+
+    def close(self) -> None:
+        self.queue.put(None)
+        self.thread.join(timeout=5)
+
+
+# Класс профилировщика медленных сценариев по выборкам стеков потоков
+# пока выполняется профилируемый интервал, с периодом interval снимаются стеки всех потоков,
+# выполняющих интервалы той же трассировки; если интервал длился дольше threshold, выборки
+# сохраняются в каталог directory в формате folded (строка "функция;функция;... количество"),
+# который принимают flamegraph.pl и speedscope
+class SamplingProfiler:
+
+    def __init__(self, threshold: float, directory: str = 'profiles', interval: float = 0.005) -> None:
+        self.threshold = threshold
+        self.directory = directory
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.samples = dict()           # id трассировки -> Counter стеков
+        self.thread_traces = dict()     # id потока -> id трассировки выполняемого им интервала
+        self.thread = None
+
+    # учет трассировки, интервал которой выполняет текущий поток; возвращает предыдущее значение
+    def enter_thread(self, trace_id: str) -> Optional[str]:
+        ident = threading.get_ident()
+        previous = self.thread_traces.get(ident)
+        self.thread_traces[ident] = trace_id
+        return previous
+
+    def exit_thread(self, previous: Optional[str]) -> None:
+        ident = threading.get_ident()
+        if previous is None:
+            self.thread_traces.pop(ident, None)
+        else:
+            self.thread_traces[ident] = previous
+
+    def start(self, trace_id: str) -> None:
+        with self.lock:
+            self.samples.setdefault(trace_id, Counter())
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.sampler_loop, name='profiler', daemon=True)
+                self.thread.start()
+
+    # завершение профилирования трассировки, сохранение выборок для медленных сценариев
+    def stop(self, span: Span) -> None:
+        with self.lock:
+            samples = self.samples.pop(span.trace_id, None)
+        if not samples or span.duration < self.threshold:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        file_name = os.path.join(self.directory, f'{time.strftime("%Y%m%d_%H%M%S")}_{span.trace_id}.folded')
+        try:
+            with open(file_name, 'w', encoding='utf-8') as file:
+                for stack, count in samples.most_common():
+                    file.write(f'{stack} {count}\n')
+        except OSError as e:
+            logger.error(f'Ошибка записи профиля. {e}')
+            return
+        logger.warning(f'Медленный сценарий <{span.name}>: {span.duration:.2f} с, профиль сохранен в {file_name}')
+
+    @staticmethod
+    def collapse(frame) -> str:
+        stack = list()
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+    def sampler_loop(self) -> None:
+        own_ident = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                if not self.samples:
+                    continue
+                traces = dict(self.thread_traces)
+                for ident, frame in sys._current_frames().items():
+                    trace_id = traces.get(ident)
+                    if ident != own_ident and trace_id in self.samples:
+                        self.samples[trace_id][self.collapse(frame)] += 1
+
+
+# Класс трассировки: вложенные интервалы с общим идентификатором трассировки сценария,
+# запись интервалов в JSONL (если задан файл) и профилирование медленных сценариев (если задан порог)
+class Tracer:
+
+    def __init__(self) -> None:
+        self.exporter = None
+        self.profiler = None
+
+    def configure(self, trace_file: str = '', profile_threshold: float = 0, profile_dir: str = 'profiles',
+                  profile_interval: float = 0.005) -> None:
+        if trace_file:
+            self.exporter = JsonlExporter(trace_file)
+        if profile_threshold > 0:
+            self.profiler = SamplingProfiler(profile_threshold, profile_dir, profile_interval)
+
+    # установка идентификатора трассировки для вложенного блока кода
+    @contextmanager
+    def trace(self, trace_id: str):
+        token = trace_id_var.set(trace_id)
+        try:
+            yield
+        finally:
+            self.reset(trace_id_var, token)
+
+    # интервал трассировки: вложенный в текущий интервал той же трассировки или корневой
+    # profile=True - интервал профилируется, если включено профилирование медленных сценариев
+    @contextmanager
+    def span(self, name: str, profile: bool = False, **attrs):
+        trace_id = trace_id_var.get()
+        if trace_id is None:
+            trace_id = new_trace_id()
+        parent = span_var.get()
+        parent_id = parent.span_id if parent is not None and parent.trace_id == trace_id else None
+        span = Span(trace_id, parent_id, name, attrs, profile and self.profiler is not None)
+        trace_token = trace_id_var.set(trace_id)
+        span_token = span_var.set(span)
+        previous = self.profiler.enter_thread(trace_id) if self.profiler else None
+        if span.profile:
+            self.profiler.start(trace_id)
+        try:
+            yield span
+        except GeneratorExit:
+            raise
+        except BaseException as e:
+            span.error = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.started
+            if self.profiler:
+                self.profiler.exit_thread(previous)
+            if span.profile:
+                self.profiler.stop(span)
+            self.reset(span_var, span_token)
+            self.reset(trace_id_var, trace_token)
+            if self.exporter:
+                self.exporter.export(span)
+
+    # восстановление значения переменной контекста; генератор может быть закрыт в другом контексте
+    @staticmethod
+    def reset(var: contextvars.ContextVar, token) -> None:
+        try:
+            var.reset(token)
+        except ValueError:
+            pass
+
+    # декоратор: выполнение функции в интервале name; для генераторов (в том числе асинхронных) - на время
+    # выдачи всех значений, для сопрограмм - до их завершения
+    def traced(self, name: str, profile: bool = False) -> Callable:
+        def decorator(func: Callable) -> Callable:
+            if inspect.isgeneratorfunction(func):
+                @functools.wraps(func)
+                def generator_wrapper(*args, **kwargs):
+                    with self.span(name, profile):
+                        yield from func(*args, **kwargs)
+                return generator_wrapper
+            if inspect.isasyncgenfunction(func):
+                @functools.wraps(func)
+                async def async_generator_wrapper(*args, **kwargs):
+                    with self.span(name, profile):
+                        async for item in func(*args, **kwargs):
+                            yield item
+                return async_generator_wrapper
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def coroutine_wrapper(*args, **kwargs):
+                    with self.span(name, profile):
+                        return await func(*args, **kwargs)
+                return coroutine_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name, profile):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def close(self) -> None:
+        if self.exporter:
+            self.exporter.close()
+
+
+# общий объект трассировки бота
+tracer = Tracer()
@@ -1,120 +1,377 @@
-import os.path
+import argparse
+import atexit
+import os
+import queue
 import sqlite3
+import threading
+import time
+from itertools import groupby
+from typing import Iterator
+
 from loguru import logger
 
+from botrequests.Metrics import metrics
+from botrequests.Tracing import tracer
+
 
 # Класс взаимодействия с базой данных SQLite
+# названия отелей хранятся в справочнике hotel, история запросов ссылается на него по id;
+# соединения с БД постоянные (отдельное соединение для каждого потока), журнал в режиме WAL;
+# запись истории выполняется фоновым потоком, который объединяет несколько запросов в одну транзакцию
 class SqliteDB:
+    # настройки соединения с БД; auto_vacuum - до журнала WAL: для новой БД режим очистки задается
+    # до записи заголовка файла (для существующей БД настройка действует только после VACUUM)
+    pragmas = (
+        'PRAGMA auto_vacuum = INCREMENTAL;',
+        'PRAGMA journal_mode = WAL;',
+        'PRAGMA synchronous = NORMAL;',
+        'PRAGMA temp_store = MEMORY;',
+        'PRAGMA cache_size = -16000;',
+        'PRAGMA busy_timeout = 5000;',
+        'PRAGMA foreign_keys = ON;'
+    )
+    # максимальное количество запросов в одной транзакции и время ожидания новых запросов (с)
+    batch_size = 100
+    batch_delay = 0.05
+    # политика хранения истории: максимальное количество запросов одного пользователя,
+    # максимальный срок хранения (сутки), интервал запуска очистки БД (с); 0 - без ограничений
+    history_max_searches = int(os.getenv('HISTORY_MAX_SEARCHES', 100))
+    history_max_age_days = float(os.getenv('HISTORY_MAX_AGE_DAYS', 365))
+    compaction_interval = float(os.getenv('HISTORY_COMPACTION_INTERVAL', 3600))
+
+    # Миграции схемы БД: (версия, описание, SQL-запросы), применяются по порядку версий
+    # номер текущей версии схемы хранится в таблице schema_version
+    migrations = (
+        (1, 'таблицы userquery и hotels', (
+            """CREATE TABLE IF NOT EXISTS userquery (
+                id INTEGER PRIMARY KEY AUTOINCREMENT
+                constraint id
+                references hotels (id)
+                on delete cascade,
+                user_id INTEGER NOT NULL,
+                datetime INTEGER NOT NULL,
+                city_name TEXT,
+                scenario TEXT);""",
+            """CREATE TABLE IF NOT EXISTS hotels (
+                id INTEGER,
+                hotel_name TEXT);"""
+        )),
+        (2, 'покрывающие индексы для истории запросов пользователя', (
+            """CREATE INDEX IF NOT EXISTS userquery_user_datetime
+                ON userquery (user_id, datetime, city_name, scenario);""",
+            """CREATE INDEX IF NOT EXISTS hotels_id
+                ON hotels (id, hotel_name);"""
+        )),
+        (3, 'справочник отелей hotel и результаты поиска search_hotel вместо таблицы hotels', (
+            # пересоздание userquery без ошибочной ссылки на hotels
+            """CREATE TABLE userquery_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                datetime INTEGER NOT NULL,
+                city_name TEXT,
+                scenario TEXT);""",
+            """INSERT INTO userquery_new (id, user_id, datetime, city_name, scenario)
+                SELECT id, user_id, datetime, city_name, scenario FROM userquery;""",
+            """DROP TABLE userquery;""",
+            """ALTER TABLE userquery_new RENAME TO userquery;""",
+            """CREATE INDEX userquery_user_datetime
+                ON userquery (user_id, datetime, city_name, scenario);""",
+            # справочник отелей: api_id - id отеля в API Hotels (NULL для записей из старой таблицы hotels)
+            """CREATE TABLE hotel (
+                id INTEGER PRIMARY KEY,
+                api_id INTEGER UNIQUE,
+                hotel_name TEXT NOT NULL);""",
+            """CREATE UNIQUE INDEX hotel_legacy_name ON hotel (hotel_name) WHERE api_id IS NULL;""",
+            """INSERT OR IGNORE INTO hotel (hotel_name)
+                SELECT hotel_name FROM hotels WHERE hotel_name IS NOT NULL ORDER BY rowid;""",
+            # отели, найденные в каждом запросе, с ценой и расстоянием до центра на момент поиска
+            """CREATE TABLE search_hotel (
+                query_id INTEGER NOT NULL REFERENCES userquery (id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                hotel_ref INTEGER NOT NULL REFERENCES hotel (id),
+                price TEXT,
+                distance REAL,
+                PRIMARY KEY (query_id, position)) WITHOUT ROWID;""",
+            """INSERT INTO search_hotel (query_id, position, hotel_ref)
+                SELECT hotels.id, hotels.rowid, hotel.id
+                FROM hotels JOIN hotel INDEXED BY hotel_legacy_name
+                    ON hotel.api_id IS NULL AND hotel.hotel_name = hotels.hotel_name
+                WHERE hotels.id IN (SELECT id FROM userquery);""",
+            """CREATE INDEX search_hotel_ref ON search_hotel (hotel_ref);""",
+            """DROP TABLE hotels;"""
+        )),
+    )
 
     def __init__(self):
         self.db_filename = '../UserHistoryDB.sqlite3'  # имя файла базы данных по умолчанию
-        self.BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+        self.BASE_DIR = os.getenv('BOT_DATA_DIR', os.path.dirname(os.path.abspath(__file__)))
+        self.local = threading.local()
+        self.write_queue = queue.Queue()
+        self.writer = None
+        self.compaction = None
+        self.compaction_stop = threading.Event()
+
+    @property
+    def db_path(self) -> str:
+        return os.path.join(self.BASE_DIR, self.db_filename)
+
+    # открытие нового соединения с БД с необходимыми настройками
+    def open_connection(self) -> sqlite3.Connection:
+        sqlite_connection = sqlite3.connect(self.db_path, timeout=5)
+        for pragma in self.pragmas:
+            sqlite_connection.execute(pragma)
+        return sqlite_connection
+
+    # постоянное соединение с БД для текущего потока
+    def get_connection(self) -> sqlite3.Connection:
+        sqlite_connection = getattr(self.local, 'connection', None)
+        if sqlite_connection is None:
+            sqlite_connection = self.open_connection()
+            self.local.connection = sqlite_connection
+            logger.debug(f'БД успешно подключена. Поток <{threading.current_thread().name}>')
+        return sqlite_connection
 
-    # Начальная инициализация базы данных, создание если ее нет
-    # база данных состоит из двух таблиц - userquery и hotels связанных по полю id
+    # Начальная инициализация базы данных, создание если ее нет, обновление схемы до последней версии
     # в таблице userquery - хранится информация о параметрах запроса
-    # в таблице hotels - список найденных отелей
+    # в таблице hotel - справочник названий отелей
+    # в таблице search_hotel - отели, найденные в каждом запросе (ссылки на userquery и hotel)
     def db_connect(self, file_name: str = None) -> None:
         if file_name:
             self.db_filename = file_name
-        db_path = os.path.join(self.BASE_DIR, self.db_filename)
         try:
-            sqlite_connection = sqlite3.connect(db_path)
-            cursor = sqlite_connection.cursor()
-            logger.info('БД успешно подключена')
-            create_table1_query = """CREATE TABLE userquery (
-                                    id INTEGER PRIMARY KEY AUTOINCREMENT 
-                                    constraint id
-			                        references hotels (id)
-				                    on delete cascade,
-                                    user_id INTEGER NOT NULL,
-                                    datetime INTEGER NOT NULL,
-                                    city_name TEXT,
-                                    scenario TEXT);"""
-            cursor.execute(create_table1_query)
-            sqlite_connection.commit()
-            logger.info(f'userquery таблица успешно создана. {cursor.fetchall()}')
-
-            create_table2_query = """CREATE TABLE hotels (
-                                                id INTEGER,
-                                                hotel_name TEXT);"""
-            cursor.execute(create_table2_query)
-            sqlite_connection.commit()
-            logger.info(f'hotels таблица успешно создана. {cursor.fetchall()}')
-            cursor.close()
-
+            self.check_incremental_vacuum(self.get_connection())
+            self.migrate(self.get_connection())
         except sqlite3.Error as e:
             logger.error(f'Ошибка БД. {e}')
+
+        # запуск фонового потока записи истории запросов
+        if self.writer is None:
+            self.writer = threading.Thread(target=self.writer_loop, name='db_writer', daemon=True)
+            self.writer.start()
+            atexit.register(self.close)
+
+        # запуск периодической очистки БД по политике хранения истории
+        if self.compaction is None and self.compaction_interval > 0:
+            self.compaction = threading.Thread(target=self.compaction_loop, name='db_compaction', daemon=True)
+            self.compaction.start()
+
+    # Проверка режима инкрементальной очистки файла БД (auto_vacuum = INCREMENTAL)
+    # для новой БД режим включается при открытии соединения; существующая БД при запуске бота не перестраивается -
+    # режим вступает в силу после команды обслуживания vacuum (см. конец модуля)
+    @staticmethod
+    def check_incremental_vacuum(sqlite_connection: sqlite3.Connection) -> bool:
+        if sqlite_connection.execute('PRAGMA auto_vacuum;').fetchone()[0] == 2:
+            return True
+        logger.warning('Инкрементальная очистка файла БД не включена, место после очистки истории не освобождается. '
+                       'Для перестройки файла выполните при остановленном боте: '
+                       'python -m botrequests.UserHistoryDB vacuum')
+        return False
+
+    # Полная перестройка файла БД (VACUUM) с включением инкрементальной очистки
+    # команда обслуживания: на время перестройки БД заблокирована для записи
+    def vacuum(self) -> None:
+        sqlite_connection = self.open_connection()
+        try:
+            self.migrate(sqlite_connection)
+            logger.info(f'Перестройка файла БД <{self.db_path}>...')
+            start = time.perf_counter()
+            sqlite_connection.execute('VACUUM;')
+            logger.info(f'Файл БД перестроен за {time.perf_counter() - start:.1f} с, '
+                        f'auto_vacuum = {sqlite_connection.execute("PRAGMA auto_vacuum;").fetchone()[0]}')
         finally:
-            if sqlite_connection:
-                sqlite_connection.close()
-                logger.info('Соединение с БД закрыто')
+            sqlite_connection.close()
+
+    # Текущая версия схемы БД, 0 - для новой БД
+    @staticmethod
+    def schema_version(sqlite_connection: sqlite3.Connection) -> int:
+        sqlite_connection.execute("""CREATE TABLE IF NOT EXISTS schema_version (
+                                    version INTEGER NOT NULL);""")
+        row = sqlite_connection.execute("""SELECT MAX(version) FROM schema_version;""").fetchone()
+        return row[0] or 0
+
+    # Обновление схемы БД до версии target_version (по умолчанию - до последней)
+    # каждая миграция выполняется в отдельной транзакции вместе с записью номера версии
+    def migrate(self, sqlite_connection: sqlite3.Connection, target_version: int = None) -> int:
+        version = self.schema_version(sqlite_connection)
+        for i_version, description, queries in self.migrations:
+            if i_version <= version or (target_version is not None and i_version > target_version):
+                continue
+            cursor = sqlite_connection.cursor()
+            try:
+                cursor.execute('BEGIN IMMEDIATE;')
+                # проверка версии после блокировки БД: миграцию мог выполнить другой процесс
+                if self.schema_version(sqlite_connection) >= i_version:
+                    sqlite_connection.rollback()
+                    continue
+                for query in queries:
+                    cursor.execute(query)
+                cursor.execute("""INSERT INTO schema_version (version) VALUES (?);""", (i_version,))
+                sqlite_connection.commit()
+            except sqlite3.Error:
+                sqlite_connection.rollback()
+                raise
+            finally:
+                cursor.close()
+            version = i_version
+            logger.info(f'Схема БД обновлена до версии {i_version}: {description}')
+        return version
 
     # Запись истории запросов пользователей
+    # in_list_hotel - список найденных отелей (объекты HotelInfo или названия отелей)
+    # данные ставятся в очередь и записываются в БД фоновым потоком
+    @metrics.timed('db_operation_seconds', 'Время выполнения операций с БД', operation='db_insert')
+    @tracer.traced('db.db_insert')
     def db_insert(self, in_dict_user: dict, in_list_hotel: list) -> None:
-        db_path = os.path.join(self.BASE_DIR, self.db_filename)
+        records_to_insert = list()
+        for hotel in in_list_hotel:
+            if isinstance(hotel, str):
+                records_to_insert += (None, hotel, None, None),
+            else:
+                records_to_insert += (hotel.hotel_id or None, hotel.hotel_name, str(hotel.price), hotel.distance),
+        self.write_queue.put((dict(in_dict_user), records_to_insert))
+
+    # Цикл фонового потока записи: запросы из очереди объединяются в одну транзакцию
+    def writer_loop(self) -> None:
+        sqlite_connection = self.open_connection()
+        stop = False
+        while not stop:
+            batch = list()
+            item = self.write_queue.get()
+            while True:
+                # None в очереди - сигнал завершения работы потока
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self.write_queue.get(timeout=self.batch_delay)
+                except queue.Empty:
+                    break
+
+            if batch:
+                self.write_batch(sqlite_connection, batch)
+            for _ in range(len(batch) + stop):
+                self.write_queue.task_done()
+        sqlite_connection.close()
+        logger.info('Соединение с БД закрыто')
+
+    # запись группы запросов пользователей в одной транзакции
+    @classmethod
+    @metrics.timed('db_operation_seconds', 'Время выполнения операций с БД', operation='write_batch')
+    def write_batch(cls, sqlite_connection: sqlite3.Connection, batch: list) -> None:
         try:
-            # Соединение с БД
-            sqlite_connection = sqlite3.connect(db_path)
             cursor = sqlite_connection.cursor()
-            logger.info('БД успешно подключена')
-
-            # список полей для запроса
-            dict_data = [in_dict_user['user_id'], in_dict_user['datetime'], in_dict_user['city_name'],
-                         in_dict_user['scenario']]
-            # текст SQL-запроса
             sqlite_insert_query = """INSERT INTO userquery
                                     (user_id, datetime, city_name, scenario)
                                     VALUES (?, ?, ?, ?);"""
-            # выполнение запроса
-            cursor.execute(sqlite_insert_query, dict_data)
-            sqlite_connection.commit()
+            sqlite_insert_hotels = """INSERT INTO search_hotel
+                                    (query_id, position, hotel_ref, price, distance)
+                                    VALUES (?, ?, ?, ?, ?);"""
+            for in_dict_user, in_list_hotel in batch:
+                # список полей для запроса
+                dict_data = [in_dict_user['user_id'], in_dict_user['datetime'], in_dict_user['city_name'],
+                             in_dict_user['scenario']]
+                cursor.execute(sqlite_insert_query, dict_data)
 
-            # получение id последней добавленной записи
-            user_id = [in_dict_user['user_id']]
-            sqlite_select_id = """SELECT id FROM userquery WHERE user_id = ? ORDER BY id DESC LIMIT 1"""
-            cursor.execute(sqlite_select_id, user_id)
-            query_result = cursor.fetchall()
-            logger.info(f'Данные в userquery успешно добавлены. {query_result}')
+                # Формирование списка отелей для добавления в таблицу search_hotel по id добавленной записи
+                query_id = cursor.lastrowid
+                records_to_insert = list()
+                for position, (api_id, hotel_name, price, distance) in enumerate(in_list_hotel):
+                    hotel_ref = cls.hotel_ref(cursor, api_id, hotel_name)
+                    records_to_insert += (query_id, position, hotel_ref, price, distance),
+                cursor.executemany(sqlite_insert_hotels, records_to_insert)
+            sqlite_connection.commit()
             cursor.close()
+            logger.debug(f'Данные истории успешно добавлены. Запросов: {len(batch)}')
 
-            # Формирование списка отелей для добавления в таблицу hotels
-            records_to_insert = list()
-            for row in in_list_hotel:
-                records_to_insert += (query_result[0][0], row),
+        except sqlite3.Error as e:
+            sqlite_connection.rollback()
+            logger.error(f'Ошибка БД. {e}')
 
-            #logger.info(f"records_to_insert: {records_to_insert}")
+    # id отеля в справочнике hotel, новый отель добавляется в справочник
+    @staticmethod
+    def hotel_ref(cursor: sqlite3.Cursor, api_id: int, hotel_name: str) -> int:
+        if api_id is None:
+            cursor.execute("""SELECT id FROM hotel INDEXED BY hotel_legacy_name
+                              WHERE api_id IS NULL AND hotel_name = ?;""", (hotel_name,))
+        else:
+            cursor.execute("""SELECT id, hotel_name FROM hotel WHERE api_id = ?;""", (api_id,))
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute("""INSERT INTO hotel (api_id, hotel_name) VALUES (?, ?);""", (api_id, hotel_name))
+            return cursor.lastrowid
+        if api_id is not None and row[1] != hotel_name:
+            cursor.execute("""UPDATE hotel SET hotel_name = ? WHERE id = ?;""", (hotel_name, row[0]))
+        return row[0]
 
-            # выполнение запроса по добавлению в БД списка найденных отелей
-            cursor = sqlite_connection.cursor()
-            sqlite_insert_query = """INSERT INTO hotels
-                                                (id, hotel_name)
-                                                VALUES (?, ?);"""
+    # Цикл периодической очистки БД
+    def compaction_loop(self) -> None:
+        while not self.compaction_stop.wait(self.compaction_interval):
+            self.compact()
 
-            cursor.executemany(sqlite_insert_query, records_to_insert)
+    # Очистка БД по политике хранения истории: удаление старых запросов, лишних запросов пользователей,
+    # отелей, на которые нет ссылок, и освобождение места в файле БД
+    @metrics.timed('db_operation_seconds', 'Время выполнения операций с БД', operation='compact')
+    def compact(self) -> None:
+        sqlite_connection = self.get_connection()
+        try:
+            cursor = sqlite_connection.cursor()
+            deleted = 0
+            if self.history_max_age_days > 0:
+                cursor.execute("""DELETE FROM userquery WHERE datetime < ?;""",
+                               (time.time() - self.history_max_age_days * 24 * 3600,))
+                deleted += cursor.rowcount
+            if self.history_max_searches > 0:
+                cursor.execute("""DELETE FROM userquery WHERE id IN (
+                                    SELECT id FROM (
+                                        SELECT id, ROW_NUMBER() OVER (
+                                            PARTITION BY user_id ORDER BY datetime DESC) AS row_number
+                                        FROM userquery)
+                                    WHERE row_number > ?);""", (self.history_max_searches,))
+                deleted += cursor.rowcount
+            cursor.execute("""DELETE FROM hotel WHERE NOT EXISTS (
+                                SELECT 1 FROM search_hotel WHERE search_hotel.hotel_ref = hotel.id);""")
+            deleted_hotels = cursor.rowcount
             sqlite_connection.commit()
-            logger.info(f'Данные в hotels успешно добавлены.')
+            cursor.execute('PRAGMA incremental_vacuum;')
+            cursor.fetchall()
+            cursor.close()
+            logger.info(f'Очистка БД: удалено запросов {deleted}, отелей {deleted_hotels}')
 
         except sqlite3.Error as e:
+            sqlite_connection.rollback()
             logger.error(f'Ошибка БД. {e}')
-        finally:
-            if sqlite_connection:
-                sqlite_connection.close()
-                logger.info('Соединение с БД закрыто')
+
+    # ожидание записи всех запросов из очереди
+    def flush(self) -> None:
+        if self.writer is not None:
+            self.write_queue.join()
+
+    # завершение фонового потока записи после записи всех запросов из очереди
+    def close(self) -> None:
+        self.compaction_stop.set()
+        if self.writer is not None:
+            self.write_queue.put(None)
+            self.writer.join()
+            self.writer = None
 
     # Получение из БД истории запросов пользователя
+    @metrics.timed('db_operation_seconds', 'Время выполнения операций с БД', operation='db_get_user_log')
+    @tracer.traced('db.db_get_user_log')
     def db_get_user_log(self, user_id: int, limit: int) -> list:
         query_result = []
-        db_path = os.path.join(self.BASE_DIR, self.db_filename)
         try:
-            sqlite_connection = sqlite3.connect(db_path)
-            cursor = sqlite_connection.cursor()
+            cursor = self.get_connection().cursor()
 
             log_filter = [user_id, limit]
-            sqlite_select_query = """SELECT userquery.scenario, userquery.datetime, hotels.hotel_name 
-                                    FROM userquery LEFT JOIN hotels ON hotels.id = userquery.id 
-                                    WHERE user_id = ? 
-                                    ORDER BY userquery.datetime DESC
+            sqlite_select_query = """SELECT userquery.scenario, userquery.datetime, hotel.hotel_name
+                                    FROM userquery
+                                    LEFT JOIN search_hotel ON search_hotel.query_id = userquery.id
+                                    LEFT JOIN hotel ON hotel.id = search_hotel.hotel_ref
+                                    WHERE user_id = ?
+                                    ORDER BY userquery.datetime DESC, search_hotel.position
                                     LIMIT ?;"""
             cursor.execute(sqlite_select_query, log_filter)
 
@@ -124,24 +381,53 @@ class SqliteDB:
         except sqlite3.Error as e:
             logger.error(f'Ошибка БД. {e}')
         finally:
-            if sqlite_connection:
-                sqlite_connection.close()
-                logger.info('Соединение с БД закрыто')
-            #logger.info(query_result)
             return query_result
 
+    # Постраничное получение истории запросов пользователя
+    # выбираются limit последних запросов, начиная с offset, затем одним запросом - найденные в них отели
+    # результат - генератор кортежей (сценарий, дата, город, список названий отелей)
+    @metrics.timed('db_operation_seconds', 'Время выполнения операций с БД', operation='db_get_user_history')
+    @tracer.traced('db.db_get_user_history')
+    def db_get_user_history(self, user_id: int, limit: int, offset: int = 0) -> Iterator[tuple]:
+        try:
+            cursor = self.get_connection().cursor()
+            cursor.execute("""SELECT id, scenario, datetime, city_name
+                              FROM userquery
+                              WHERE user_id = ?
+                              ORDER BY datetime DESC
+                              LIMIT ? OFFSET ?;""", (user_id, limit, offset))
+            queries = cursor.fetchall()
+            if not queries:
+                return
+
+            query_ids = [i_query[0] for i_query in queries]
+            cursor.execute(f"""SELECT search_hotel.query_id, hotel.hotel_name
+                               FROM search_hotel JOIN hotel ON hotel.id = search_hotel.hotel_ref
+                               WHERE search_hotel.query_id IN ({', '.join('?' * len(query_ids))})
+                               ORDER BY search_hotel.query_id, search_hotel.position;""", query_ids)
+            hotels = {query_id: [row[1] for row in rows]
+                      for query_id, rows in groupby(cursor, key=lambda row: row[0])}
+            cursor.close()
+
+        except sqlite3.Error as e:
+            logger.error(f'Ошибка БД. {e}')
+            return
+
+        for query_id, scenario, query_datetime, city_name in queries:
+            yield scenario, query_datetime, city_name, hotels.get(query_id, [])
+
     # Запрос списка их последних трех названий городов, которые были запрошены пользователем
+    @metrics.timed('db_operation_seconds', 'Время выполнения операций с БД', operation='db_city_list')
+    @tracer.traced('db.db_city_list')
     def db_city_list(self, user_id: int) -> list:
         query_result = []
-        db_path = os.path.join(self.BASE_DIR, self.db_filename)
         try:
-            sqlite_connection = sqlite3.connect(db_path)
-            cursor = sqlite_connection.cursor()
+            cursor = self.get_connection().cursor()
 
             log_filter = [user_id, ]
             sqlite_select_query = """SELECT DISTINCT city_name
-                                            FROM userquery 
-                                            WHERE user_id = ? 
+                                            FROM userquery
+                                            WHERE user_id = ?
                                             ORDER BY datetime DESC
                                             LIMIT 3;"""
             cursor.execute(sqlite_select_query, log_filter)
@@ -154,7 +440,21 @@ class SqliteDB:
         except sqlite3.Error as e:
             logger.error(f'Ошибка БД. {e}')
         finally:
-            if sqlite_connection:
-                sqlite_connection.close()
-                logger.info('Соединение с БД закрыто')
             return query_result
+
+
+# Команды обслуживания БД истории (выполняются при остановленном боте):
+#     python -m botrequests.UserHistoryDB vacuum [--file HistoryDB.sqlite3]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Обслуживание БД истории запросов')
+    parser.add_argument('command', choices=('vacuum',), help='vacuum - перестройка файла БД с включением '
+                                                              'инкрементальной очистки')
+    parser.add_argument('--file', default='HistoryDB.sqlite3', help='имя файла БД в каталоге BOT_DATA_DIR')
+    args = parser.parse_args()
+    history_db = SqliteDB()
+    history_db.db_filename = args.file
+    try:
+        history_db.vacuum()
+    except sqlite3.Error as e:
+        logger.error(f'Ошибка БД. {e}')
+        raise SystemExit(1)
@@ -0,0 +1,193 @@
+import hmac
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from loguru import logger
+from telebot import types
+
+from botrequests.Metrics import metrics
+
+# максимальный размер тела запроса с обновлением, байт
+MAX_BODY_SIZE = 1024 * 1024
+# заголовок с секретным ключом webhook (secret_token из setWebhook), который Telegram передает в каждом запросе
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+# ключ распределения обновления - id пользователя, как у блокировок и сессий диалога (в групповом чате
+# обновления одного пользователя обрабатываются одним потоком по порядку); id чата - если отправитель неизвестен
+def update_user_id(update: types.Update) -> int:
+    if update.callback_query is not None:
+        return update.callback_query.from_user.id
+    for message in (update.message, update.edited_message):
+        if message is not None:
+            return message.from_user.id if message.from_user is not None else message.chat.id
+    return 0
+
+
+# Класс очереди обработки обновлений, полученных через webhook
+# обновления распределяются по потокам по id пользователя (очередь каждого потока ограничена queue_size / workers),
+# поэтому шаги диалога одного пользователя выполняются строго по порядку;
+# при заполненной очереди обновление не принимается - Telegram повторит его доставку позже
+class UpdateDispatcher:
+
+    def __init__(self, process: Callable, workers: int = 4, queue_size: int = 1000) -> None:
+        self.process = process
+        self.queues = [queue.Queue(maxsize=max(1, queue_size // workers)) for _ in range(workers)]
+        self.workers = [threading.Thread(target=self.worker_loop, args=(i_queue,), name=f'webhook_{i}', daemon=True)
+                        for i, i_queue in enumerate(self.queues)]
+        self.updates = metrics.counter('webhook_updates_total', 'Количество обновлений, полученных через webhook',
+                                       ('result',))
+        self.wait_time = metrics.histogram('webhook_queue_wait_seconds', 'Время ожидания обновления в очереди')
+
+    def start(self) -> None:
+        for worker in self.workers:
+            worker.start()
+
+    def qsize(self) -> int:
+        return sum(i_queue.qsize() for i_queue in self.queues)
+
+    # постановка обновления в очередь, False - очередь заполнена
+    # body - исходное тело запроса (используется при передаче обновления другому процессу)
+    def submit(self, update: types.Update, body: bytes = b'') -> bool:
+        try:
+            self.queues[update_user_id(update) % len(self.queues)].put_nowait((time.perf_counter(), update))
+        except queue.Full:
+            self.updates.inc(result='rejected')
+            return False
+        self.updates.inc(result='accepted')
+        return True
+
+    def worker_loop(self, updates: queue.Queue) -> None:
+        while True:
+            item = updates.get()
+            if item is None:
+                return
+            submitted, update = item
+            self.wait_time.observe(time.perf_counter() - submitted)
+            try:
+                self.process([update])
+            except Exception as e:
+                logger.exception(f'Ошибка обработки обновления <{update.update_id}>. {e}')
+
+    # остановка после обработки всех принятых обновлений
+    def stop(self, timeout: float = None) -> None:
+        for i_queue in self.queues:
+            i_queue.put(None)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for worker in self.workers:
+            worker.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            if worker.is_alive():
+                logger.warning(f'Обработка обновлений не завершена за {timeout} с, осталось: {self.qsize()}')
+                return
+
+
+# Класс распределения обновлений между процессами бота (маршрутизатор webhook)
+# обновление передается без изменений процессу workers[id пользователя % количество процессов], поэтому сообщения
+# одного пользователя всегда обрабатывает один процесс; состояние диалогов процессы хранят в общем хранилище.
+# Интерфейс - как у UpdateDispatcher: если процесс не принял обновление, Telegram повторит его доставку позже
+class UpdateRouter:
+
+    # secret_token - секретный ключ, который передается процессам бота в заголовке SECRET_HEADER
+    def __init__(self, workers: list, secret_token: str, path: str = '/webhook', timeout: float = 10.0) -> None:
+        self.urls = [url.rstrip('/') + path for url in workers]
+        self.headers = {'Content-Type': 'application/json', SECRET_HEADER: secret_token}
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.urls), pool_maxsize=32)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.updates = metrics.counter('webhook_routed_total', 'Количество обновлений, переданных процессам бота',
+                                       ('worker', 'result'))
+
+    def start(self) -> None:
+        pass
+
+    def qsize(self) -> int:
+        return 0
+
+    # передача обновления процессу бота, False - процесс недоступен или его очередь заполнена
+    def submit(self, update: types.Update, body: bytes = b'') -> bool:
+        worker = update_user_id(update) % len(self.urls)
+        try:
+            response = self.session.post(self.urls[worker], data=body, headers=self.headers, timeout=self.timeout)
+            accepted = response.status_code == 200
+        except requests.RequestException as e:
+            logger.error(f'Ошибка передачи обновления процессу <{self.urls[worker]}>. {e}')
+            accepted = False
+        self.updates.inc(worker=str(worker), result='accepted' if accepted else 'rejected')
+        return accepted
+
+    def stop(self, timeout: float = None) -> None:
+        self.session.close()
+
+
+# Обработчик запросов Telegram к webhook
+# принимаются только запросы с секретным ключом сервера в заголовке SECRET_HEADER, остальные - ответ 403
+class WebhookHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def reply(self, code: int, retry_after: Optional[int] = None) -> None:
+        self.send_response(code)
+        if retry_after is not None:
+            self.send_header('Retry-After', str(retry_after))
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self) -> None:
+        if self.path != self.server.path:
+            self.reply(404)
+            return
+        if not hmac.compare_digest(self.headers.get(SECRET_HEADER, '').encode(), self.server.secret_token.encode()):
+            self.reply(403)
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0 or length > MAX_BODY_SIZE:
+            self.reply(413 if length > 0 else 400)
+            return
+        body = self.rfile.read(length)
+        try:
+            update = types.Update.de_json(json.loads(body))
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f'Ошибка разбора обновления webhook. {e}')
+            self.reply(400)
+            return
+        if self.server.dispatcher.submit(update, body):
+            self.reply(200)
+        else:
+            self.reply(503, retry_after=1)
+
+
+# Класс HTTP-сервера webhook: принимает обновления Telegram по адресу path и передает их в очередь обработки
+# (UpdateDispatcher) или процессам бота (UpdateRouter)
+class WebhookServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, dispatcher, secret_token: str, host: str = '0.0.0.0', port: int = 8443,
+                 path: str = '/webhook') -> None:
+        if not secret_token:
+            raise ValueError('Не задан секретный ключ webhook')
+        super().__init__((host, port), WebhookHandler)
+        self.dispatcher = dispatcher
+        self.secret_token = secret_token
+        self.path = path
+        self.thread = threading.Thread(target=self.serve_forever, name='webhook', daemon=True)
+
+    def start(self) -> None:
+        self.dispatcher.start()
+        self.thread.start()
+        logger.info(f'Webhook принимает обновления по адресу '
+                    f'http://{self.server_address[0]}:{self.server_address[1]}{self.path}')
+
+    # остановка приема обновлений и обработка уже принятых
+    def stop(self, timeout: float = None) -> None:
+        self.shutdown()
+        self.server_close()
+        self.dispatcher.stop(timeout)
@@ -0,0 +1,272 @@
+"""Нагрузочный тест бота: сценарии /lowprice, /highprice, /bestdeal и /history для множества чатов.
+
+Запуск из корня репозитория:
+    python loadtest/run_load.py [--chats 1000] [--concurrency 100] [--flows lowprice,highprice,bestdeal,history]
+
+Бот (MyTeleBot из main.py) запускается в этом же процессе и работает с локальными заменителями
+Hotels API и Telegram Bot API (loadtest/stub_servers.py); база истории и кэш городов создаются
+во временном каталоге. Сообщения пользователей передаются боту через process_new_updates,
+как при получении от Telegram, а ответы бота принимаются заменителем Telegram Bot API.
+
+С параметром --bot asyncio вместо MyTeleBot запускается асинхронный вариант бота (MyAsyncTeleBot
+из async_main.py) в отдельном потоке с циклом событий.
+
+Для каждого шага сценария измеряется время от сообщения пользователя до ответа бота, которого
+ожидает пользователь (следующий вопрос или итоговое сообщение с результатами). В отчете -
+количество шагов, ошибки (нет ответа за --timeout секунд), p50/p95/p99 по шагам и сценариям
+и пропускная способность. По умолчанию ограничения частоты отправки сообщений подняты, чтобы
+измерять сам бот; реальные ограничения Telegram задаются --global-rate 30 --chat-rate 1 --chat-burst 3.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stub_servers import Faults, HotelsApiStub, TelegramStub, start_server  # noqa: E402
+
+# сценарии: шаги (название шага, сообщение пользователя, начало ожидаемого ответа бота)
+# {city} заменяется названием города чата
+FLOWS = {
+    'lowprice': [('command', '/lowprice', 'Поиск самых дешёвых'),
+                 ('city', '{city}', 'Какое количество отелей'),
+                 ('page_size', '5', 'Выводить фотографии'),
+                 ('photo', 'Да', 'Какое количество фотографий'),
+                 ('results', '2', 'Количество найденных отелей')],
+    'highprice': [('command', '/highprice', 'Поиск самых дорогих'),
+                  ('city', '{city}', 'Какое количество отелей'),
+                  ('page_size', '5', 'Выводить фотографии'),
+                  ('results', 'Нет', 'Количество найденных отелей')],
+    'bestdeal': [('command', '/bestdeal', 'Поиск отелей, наиболее подходящих'),
+                 ('city', '{city}', 'Какое количество отелей'),
+                 ('page_size', '5', 'Выводить фотографии'),
+                 ('photo', 'Нет', 'В каком диапазоне цен'),
+                 ('price', '50-400', 'Введите диапазон расстояний'),
+                 ('results', '0-5', 'Количество найденных отелей')],
+    'history': [('command', '/history', 'Cколько запросов'),
+                ('results', '3', ('Дата:', 'История Ваших запросов пуста'))],
+}
+
+
+# Сообщения, полученные заменителем Telegram Bot API, по чатам
+class Inbox:
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.chats = dict()
+        self.received = 0
+
+    def open(self, chat_id: int) -> None:
+        with self.lock:
+            self.chats[chat_id] = (threading.Condition(), deque())
+
+    def close(self, chat_id: int) -> None:
+        with self.lock:
+            self.chats.pop(chat_id, None)
+
+    def on_message(self, chat_id: int, method: str, text) -> None:
+        with self.lock:
+            self.received += 1
+            chat = self.chats.get(chat_id)
+        if chat is None:
+            return
+        cond, messages = chat
+        with cond:
+            messages.append(text or '')
+            cond.notify()
+
+    # ожидание сообщения, начинающегося с prefix; предшествующие ему сообщения пропускаются
+    def wait_for(self, chat_id: int, prefix, timeout: float) -> bool:
+        cond, messages = self.chats[chat_id]
+        deadline = time.monotonic() + timeout
+        with cond:
+            while True:
+                while messages:
+                    if messages.popleft().startswith(prefix):
+                        return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                cond.wait(remaining)
+
+
+# Запуск асинхронного бота в отдельном потоке с циклом событий;
+# process_new_updates передает обновления в цикл событий без ожидания их обработки, как и MyTeleBot
+class AsyncBotRunner:
+
+    def __init__(self, bot) -> None:
+        self.bot = bot
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='asyncio', daemon=True)
+        self.thread.start()
+        self.call(bot.hotels_api.open())
+
+    def call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def process_new_updates(self, updates: list) -> None:
+        asyncio.run_coroutine_threadsafe(self.bot.process_new_updates(updates), self.loop)
+
+    def stop(self) -> None:
+        self.call(self.bot.hotels_api.close())
+        self.call(self.bot.close_session())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.bot.DB.close()
+
+
+# Имитация пользователей: сообщения передаются боту, как полученные от Telegram
+class LoadGenerator:
+
+    def __init__(self, bot, inbox: Inbox, think_time: float, timeout: float) -> None:
+        from telebot import types
+        self.types = types
+        self.bot = bot
+        self.inbox = inbox
+        self.think_time = think_time
+        self.timeout = timeout
+        self.update_ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.latency = defaultdict(list)    # шаг или сценарий -> времена ответа, с
+        self.errors = defaultdict(int)
+
+    def send(self, chat_id: int, text: str) -> None:
+        user = {'id': chat_id, 'is_bot': False, 'first_name': 'Нагрузка', 'username': f'load{chat_id}'}
+        update = self.types.Update.de_json({
+            'update_id': next(self.update_ids),
+            'message': {'message_id': next(self.update_ids), 'from': user, 'date': int(time.time()),
+                        'chat': {'id': chat_id, 'type': 'private'}, 'text': text}})
+        self.bot.process_new_updates([update])
+
+    def record(self, name: str, elapsed: float = None) -> None:
+        with self.lock:
+            if elapsed is None:
+                self.errors[name] += 1
+            else:
+                self.latency[name].append(elapsed)
+
+    # выполнение сценариев одного чата, False - если бот не ответил на одном из шагов
+    def run_chat(self, chat_id: int, city: str, flows: list) -> bool:
+        self.inbox.open(chat_id)
+        try:
+            for flow in flows:
+                flow_time = 0.0
+                for stage, text, expected in FLOWS[flow]:
+                    time.sleep(self.think_time)
+                    start = time.perf_counter()
+                    self.send(chat_id, text.format(city=city))
+                    if not self.inbox.wait_for(chat_id, expected, self.timeout):
+                        self.record(f'{flow}:{stage}')
+                        self.record(flow)
+                        return False
+                    elapsed = time.perf_counter() - start
+                    flow_time += elapsed
+                    self.record(f'{flow}:{stage}', elapsed)
+                self.record(flow, flow_time)
+            return True
+        finally:
+            self.inbox.close(chat_id)
+
+
+def percentile(values: list, percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * percent / 100), len(ordered) - 1)]
+
+
+def report(generator: LoadGenerator, flows: list, elapsed: float, completed: int, chats: int) -> None:
+    print(f'\nЧатов: {chats}, выполнено полностью: {completed}, время: {elapsed:.1f} с, '
+          f'сценариев в секунду: {completed * len(flows) / elapsed:.1f}')
+    print(f'{"шаг":28} {"кол-во":>7} {"ошибки":>7} {"p50, мс":>9} {"p95, мс":>9} {"p99, мс":>9}')
+    names = [f'{flow}:{stage}' for flow in flows for stage, _, _ in FLOWS[flow]] + flows
+    for name in names:
+        values = generator.latency.get(name, [])
+        if name in flows:
+            print('-' * 73)
+        if not values:
+            print(f'{name:28} {0:7} {generator.errors.get(name, 0):7}')
+            continue
+        print(f'{name:28} {len(values):7} {generator.errors.get(name, 0):7} '
+              f'{percentile(values, 50) * 1000:9.1f} {percentile(values, 95) * 1000:9.1f} '
+              f'{percentile(values, 99) * 1000:9.1f}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Нагрузочный тест бота с заменителями Hotels API и Telegram')
+    parser.add_argument('--chats', type=int, default=1000, help='количество имитируемых чатов')
+    parser.add_argument('--concurrency', type=int, default=100, help='количество одновременно активных чатов')
+    parser.add_argument('--flows', default='lowprice,highprice,bestdeal,history',
+                        help='сценарии, выполняемые каждым чатом по порядку')
+    parser.add_argument('--cities', type=int, default=50, help='количество разных городов в запросах')
+    parser.add_argument('--think-ms', type=float, default=50, help='пауза пользователя перед каждым сообщением, мс')
+    parser.add_argument('--timeout', type=float, default=60, help='время ожидания ответа бота, с')
+    parser.add_argument('--api-latency-ms', type=float, default=50)
+    parser.add_argument('--api-jitter-ms', type=float, default=20)
+    parser.add_argument('--api-error-rate', type=float, default=0)
+    parser.add_argument('--telegram-latency-ms', type=float, default=20)
+    parser.add_argument('--telegram-error-rate', type=float, default=0)
+    parser.add_argument('--global-rate', default='1000', help='TELEGRAM_GLOBAL_RATE бота')
+    parser.add_argument('--chat-rate', default='20', help='TELEGRAM_CHAT_RATE бота')
+    parser.add_argument('--chat-burst', default='20', help='TELEGRAM_CHAT_BURST бота')
+    parser.add_argument('--bot-threads', default='16', help='BOT_WORKER_THREADS бота')
+    parser.add_argument('--bot', choices=('threads', 'asyncio'), default='threads',
+                        help='вариант бота: MyTeleBot (main.py) или MyAsyncTeleBot (async_main.py)')
+    args = parser.parse_args()
+    flows = args.flows.split(',')
+
+    inbox = Inbox()
+    hotels = HotelsApiStub(('127.0.0.1', 0), Faults(args.api_latency_ms, args.api_jitter_ms, args.api_error_rate))
+    telegram = TelegramStub(('127.0.0.1', 0), Faults(args.telegram_latency_ms, args.telegram_latency_ms / 2,
+                                                     args.telegram_error_rate), on_message=inbox.on_message)
+    start_server(hotels)
+    start_server(telegram)
+
+    # настройки бота задаются до импорта main.py: они читаются при создании классов
+    data_dir = tempfile.mkdtemp(prefix='bot_loadtest_')
+    os.environ.update(BOT_TOKEN='123456:loadtest', HOTELS_API_URL=hotels.url, TELEGRAM_API_URL=telegram.url,
+                      BOT_DATA_DIR=data_dir, TELEGRAM_GLOBAL_RATE=args.global_rate,
+                      TELEGRAM_CHAT_RATE=args.chat_rate, TELEGRAM_CHAT_BURST=args.chat_burst,
+                      BOT_WORKER_THREADS=args.bot_threads)
+    os.chdir(data_dir)
+    from loguru import logger
+    logger.remove()
+    if args.bot == 'asyncio':
+        import async_main as bot_main
+        bot = AsyncBotRunner(bot_main.my_bot)
+    else:
+        import main as bot_main
+        bot = bot_main.my_bot
+    logger.remove()
+    logger.add(os.path.join(data_dir, 'bot_logfile.log'), level='WARNING')
+
+    generator = LoadGenerator(bot, inbox, args.think_ms / 1000, args.timeout)
+    cities = [f'Город {i}' for i in range(args.cities)]
+    print(f'Hotels API: {hotels.url}, Telegram: {telegram.url}, данные: {data_dir}')
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix='chat') as executor:
+        results = list(executor.map(lambda i: generator.run_chat(10 ** 9 + i, cities[i % len(cities)], flows),
+                                    range(args.chats)))
+    elapsed = time.perf_counter() - start
+
+    report(generator, flows, elapsed, sum(results), args.chats)
+    api = bot_main.my_bot.hotels_api
+    print(f'\nHotels API: {dict(hotels.requests)}')
+    print(f'Telegram: {dict(telegram.requests)}, сообщений в секунду: {inbox.received / elapsed:.1f}')
+    print(f'Кэш городов: {api.city_cache.stats()}')
+    print(f'Кэш поиска: {api.search_cache.stats()}')
+    if args.bot == 'asyncio':
+        bot.stop()
+    else:
+        bot.outbox.stop(timeout=5)
+        bot.DB.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+"""Локальные заменители Hotels API и Telegram Bot API для нагрузочного тестирования бота.
+
+Запуск отдельно от бота (из корня репозитория):
+    python loadtest/stub_servers.py [--hotels-port 8081] [--telegram-port 8082] [--latency-ms 50] [--error-rate 0.01]
+
+Бот направляется на заменители переменными окружения:
+    HOTELS_API_URL=http://127.0.0.1:8081  TELEGRAM_API_URL=http://127.0.0.1:8082
+
+Hotels API отвечает на locations/search, properties/list и properties/get-hotel-photos ответами
+в формате записанных ответов API из каталога payloads: для каждого города генерируется постоянный
+набор отелей (цены, координаты, расстояния до центра), к которому применяются фильтр цен,
+сортировка и разбиение на страницы. Telegram Bot API принимает вызовы методов отправки сообщений
+и возвращает корректные объекты Message. Для обоих серверов задаются задержка ответа
+и доля ответов с ошибками (5xx для Hotels API, 429 с retry_after для Telegram).
+"""
+import argparse
+import copy
+import json
+import math
+import os
+import random
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+from urllib.parse import parse_qs, urlparse
+
+PAYLOADS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'payloads')
+
+
+def load_payload(file_name: str) -> dict:
+    with open(os.path.join(PAYLOADS_DIR, file_name), encoding='utf-8') as file:
+        return json.load(file)
+
+
+# Задержка и ошибки ответов сервера: задержка - случайная, со средним latency_ms и разбросом jitter_ms
+class Faults:
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0, seed: int = None) -> None:
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def delay(self) -> None:
+        with self.lock:
+            latency = self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+    def error(self) -> bool:
+        if self.error_rate <= 0:
+            return False
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+
+# Общий обработчик запросов: разбор адреса и параметров, ответ json
+class JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def params(self) -> dict:
+        query = parse_qs(urlparse(self.path).query)
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            body = self.rfile.read(length)
+            if self.headers.get('Content-Type', '').startswith('application/x-www-form-urlencoded'):
+                query.update(parse_qs(body.decode('utf-8')))
+        return {key: value[-1] for key, value in query.items()}
+
+    def send_json(self, status: int, data, headers: dict = None) -> None:
+        body = data if isinstance(data, bytes) else json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:
+        self.do_GET()
+
+
+# Заменитель Hotels API
+class HotelsApiStub(ThreadingHTTPServer):
+    daemon_threads = True
+    # очередь входящих соединений: асинхронный бот открывает много соединений одновременно
+    request_queue_size = 1024
+
+    def __init__(self, address: tuple, faults: Faults = None, hotels_per_city: int = 300) -> None:
+        super().__init__(address, HotelsApiHandler)
+        self.faults = faults or Faults()
+        self.hotels_per_city = hotels_per_city
+        self.locations = load_payload('locations_search.json')
+        self.properties = load_payload('properties_list.json')
+        self.photos = load_payload('hotel_photos.json')
+        self.templates = self.properties['data']['body']['searchResults']['results']
+        self.cities = OrderedDict()
+        self.lock = threading.Lock()
+        self.requests = Counter()
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.server_address[0]}:{self.server_address[1]}'
+
+    # destinationId города по его названию (для любого названия - постоянное значение)
+    @staticmethod
+    def destination_id(name: str) -> int:
+        return 1000000 + zlib.crc32(name.strip().casefold().encode('utf-8')) % 9000000
+
+    # координаты центра города по destinationId
+    @staticmethod
+    def city_center(dest_id: int) -> tuple:
+        rnd = random.Random(dest_id)
+        return round(rnd.uniform(-60, 70), 6), round(rnd.uniform(-170, 170), 6)
+
+    def locations_search(self, params: dict) -> dict:
+        response = copy.deepcopy(self.locations)
+        dest_id = self.destination_id(params.get('query', ''))
+        lat, lon = self.city_center(dest_id)
+        entity = response['suggestions'][0]['entities'][0]
+        entity.update(destinationId=str(dest_id), name=params.get('query', ''), latitude=lat, longitude=lon,
+                      caption=f"<span class='highlighted'>{params.get('query', '')}</span>")
+        return response
+
+    # постоянный набор отелей города: (цена, id, широта, долгота, расстояние до центра, номер шаблона)
+    def city_hotels(self, dest_id: int) -> list:
+        with self.lock:
+            hotels = self.cities.get(dest_id)
+            if hotels is not None:
+                self.cities.move_to_end(dest_id)
+                return hotels
+        rnd = random.Random(-dest_id)
+        center_lat, center_lon = self.city_center(dest_id)
+        hotels = list()
+        for i in range(self.hotels_per_city):
+            # отели расположены плотнее к центру города
+            distance = round(min(rnd.expovariate(1 / 3), 30), 1)
+            angle = rnd.uniform(0, 2 * math.pi)
+            lat = center_lat + distance * math.sin(angle) / 111.2
+            lon = center_lon + distance * math.cos(angle) / (111.2 * max(math.cos(math.radians(center_lat)), 0.01))
+            hotels.append((float(rnd.randint(20, 800)), dest_id * 1000 + i, round(lat, 6), round(lon, 6), distance,
+                           i % len(self.templates)))
+        with self.lock:
+            self.cities[dest_id] = hotels
+            while len(self.cities) > 1000:
+                self.cities.popitem(last=False)
+        return hotels
+
+    def properties_list(self, params: dict) -> dict:
+        dest_id = int(params.get('destinationId', 0))
+        page_number = max(int(params.get('pageNumber', 1)), 1)
+        page_size = min(max(int(params.get('pageSize', 25)), 1), 25)
+        hotels = self.city_hotels(dest_id)
+        if params.get('priceMax'):
+            low, high = float(params.get('priceMin') or 0), float(params['priceMax'])
+            hotels = [i for i in hotels if low <= i[0] <= high]
+        hotels = sorted(hotels, key=lambda i: (i[0], i[1]), reverse=params.get('sortOrder') == 'PRICE_HIGHEST_FIRST')
+        page = hotels[(page_number - 1) * page_size:page_number * page_size]
+
+        results = list()
+        for price, hotel_id, lat, lon, distance, template in page:
+            result = copy.deepcopy(self.templates[template])
+            result['id'] = hotel_id
+            result['name'] = f"{result['name']} {hotel_id % 1000}"
+            result['coordinate'] = {'lat': lat, 'lon': lon}
+            result['ratePlan']['price'].update(current=f'${int(price):,}', exactPrice=price,
+                                               old=f'${int(price * 1.2):,}')
+            # в части ответов API нет ориентира "Центр города" - как и в шаблоне
+            for landmark in result.get('landmarks', []):
+                if landmark['label'] in ('City center', 'Центр города'):
+                    landmark['distance'] = f'{distance:.1f} км'.replace('.', ',')
+            results.append(result)
+
+        response = copy.copy(self.properties)
+        response['data'] = copy.copy(response['data'])
+        body = response['data']['body'] = copy.copy(response['data']['body'])
+        body['searchResults'] = dict(body['searchResults'], totalCount=len(hotels), results=results,
+                                     pagination={'currentPage': page_number, 'nextPageNumber': page_number + 1})
+        return response
+
+    def hotel_photos(self, params: dict) -> dict:
+        return dict(self.photos, hotelId=int(params.get('id', 0)))
+
+
+class HotelsApiHandler(JsonHandler):
+
+    def do_GET(self) -> None:
+        server = self.server
+        path = urlparse(self.path).path.rstrip('/')
+        params = self.params()
+        server.faults.delay()
+        routes = {'/locations/search': server.locations_search,
+                  '/properties/list': server.properties_list,
+                  '/properties/get-hotel-photos': server.hotel_photos}
+        route = routes.get(path)
+        with server.lock:
+            server.requests[path] += 1
+        if route is None:
+            self.send_json(404, {'message': 'Endpoint does not exist'})
+        elif server.faults.error():
+            with server.lock:
+                server.requests['errors'] += 1
+            self.send_json(503, {'message': 'Service Unavailable'})
+        else:
+            self.send_json(200, route(params))
+
+
+# Заменитель Telegram Bot API
+# on_message(chat_id, method, text) вызывается для каждого принятого сообщения
+class TelegramStub(ThreadingHTTPServer):
+    daemon_threads = True
+    # очередь входящих соединений: асинхронный бот открывает много соединений одновременно
+    request_queue_size = 1024
+
+    def __init__(self, address: tuple, faults: Faults = None, retry_after: int = 1,
+                 on_message: Callable = None) -> None:
+        super().__init__(address, TelegramHandler)
+        self.faults = faults or Faults()
+        self.retry_after = retry_after
+        self.on_message = on_message
+        self.lock = threading.Lock()
+        self.message_id = 0
+        self.requests = Counter()
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.server_address[0]}:{self.server_address[1]}'
+
+    def next_message_id(self) -> int:
+        with self.lock:
+            self.message_id += 1
+            return self.message_id
+
+
+class TelegramHandler(JsonHandler):
+
+    def do_GET(self) -> None:
+        server = self.server
+        parts = urlparse(self.path).path.strip('/').split('/')
+        method = parts[-1] if len(parts) == 2 and parts[0].startswith('bot') else ''
+        params = self.params()
+        server.faults.delay()
+        with server.lock:
+            server.requests[method] += 1
+
+        if not method:
+            self.send_json(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+            return
+        if server.faults.error():
+            with server.lock:
+                server.requests['429'] += 1
+            self.send_json(429, {'ok': False, 'error_code': 429,
+                                 'description': f'Too Many Requests: retry after {server.retry_after}',
+                                 'parameters': {'retry_after': server.retry_after}},
+                           headers={'Retry-After': server.retry_after})
+            return
+
+        chat_id = params.get('chat_id')
+        chat = {'id': int(chat_id) if chat_id and chat_id.lstrip('-').isdigit() else 0, 'type': 'private'}
+        if method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'stub', 'username': 'stub_bot'}
+        elif method == 'getUpdates':
+            result = list()
+        elif method == 'sendMediaGroup':
+            media = json.loads(params.get('media', '[]'))
+            result = [{'message_id': server.next_message_id(), 'date': int(time.time()), 'chat': chat,
+                       'caption': i.get('caption')} for i in media]
+            self.notify(chat['id'], method, media[0].get('caption') if media else None)
+        elif method.startswith('send') or method.startswith('edit'):
+            text = params.get('text', params.get('caption'))
+            result = {'message_id': int(params.get('message_id') or server.next_message_id()),
+                      'date': int(time.time()), 'chat': chat, 'text': text}
+            self.notify(chat['id'], method, text)
+        else:
+            result = True
+        self.send_json(200, {'ok': True, 'result': result})
+
+    def notify(self, chat_id: int, method: str, text) -> None:
+        if self.server.on_message is not None:
+            self.server.on_message(chat_id, method, text)
+
+
+def start_server(server: ThreadingHTTPServer) -> threading.Thread:
+    thread = threading.Thread(target=server.serve_forever, name=type(server).__name__, daemon=True)
+    thread.start()
+    return thread
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Заменители Hotels API и Telegram Bot API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--hotels-port', type=int, default=8081)
+    parser.add_argument('--telegram-port', type=int, default=8082)
+    parser.add_argument('--latency-ms', type=float, default=50, help='средняя задержка ответа Hotels API, мс')
+    parser.add_argument('--jitter-ms', type=float, default=20, help='разброс задержки ответа Hotels API, мс')
+    parser.add_argument('--error-rate', type=float, default=0, help='доля ответов Hotels API с ошибкой 503')
+    parser.add_argument('--telegram-latency-ms', type=float, default=20)
+    parser.add_argument('--telegram-error-rate', type=float, default=0, help='доля ответов Telegram с ошибкой 429')
+    parser.add_argument('--hotels-per-city', type=int, default=300)
+    args = parser.parse_args()
+
+    hotels = HotelsApiStub((args.host, args.hotels_port), Faults(args.latency_ms, args.jitter_ms, args.error_rate),
+                           hotels_per_city=args.hotels_per_city)
+    telegram = TelegramStub((args.host, args.telegram_port),
+                            Faults(args.telegram_latency_ms, args.telegram_latency_ms / 2, args.telegram_error_rate))
+    start_server(hotels)
+    start_server(telegram)
+    print(f'HOTELS_API_URL={hotels.url}\nTELEGRAM_API_URL={telegram.url}')
+    try:
+        while True:
+            time.sleep(10)
+            print(f'Hotels API: {dict(hotels.requests)}  Telegram: {dict(telegram.requests)}')
+    except KeyboardInterrupt:
+        hotels.shutdown()
+        telegram.shutdown()
+
+
+if __name__ == '__main__':
+    main()